@@ -0,0 +1,7 @@
+"""Functions shared by several test modules."""
+
+def tree_to_str(t):
+    """Write a `Tree` as a bracketed string, like ``(S a (S ε) b)``."""
+    if len(t.children) == 0:
+        return str(t.label)
+    return '({} {})'.format(t.label, ' '.join(map(tree_to_str, t.children)))
@@ -1,7 +1,9 @@
 import unittest
 import tock
 from tock.grammars import *
+from tock.grammars import EarleyChart, CYKChart
 from tock.syntax import String
+from .helpers import tree_to_str
 
 class TestGrammar(unittest.TestCase):
     def test_init(self):
@@ -93,3 +95,135 @@ class TestGrammar(unittest.TestCase):
         follow_correct = {'S': {'c', '⊣'},
                           'T': {'c', '⊣'}}
         self.assertEqual(follow, follow_correct)
+
+    def test_first_follow_cycles(self):
+        g = Grammar.from_lines(['S -> A b',
+                                'S -> &',
+                                'A -> S a',
+                                'A -> B',
+                                'B -> A',
+                                'B -> c'])
+        nullable = g.compute_nullable()
+        self.assertEqual(nullable, set(map(String, ['S', '&'])))
+        first = g.compute_first(nullable)
+        for x in 'SAB':
+            self.assertEqual(first[String(x)], {'a', 'c'})
+        self.assertEqual(first[String('S a')], {'a', 'c'})
+        self.assertEqual(g.compute_follow(), {'S': {'a', '⊣'},
+                                              'A': {'b'},
+                                              'B': {'b'}})
+
+    def test_pda_to_cfg(self):
+        m = tock.PushdownAutomaton()
+        m.set_start_state('q1')
+        m.add_accept_state('q3')
+        m.add_transition('q1, a, & -> q1, x')
+        m.add_transition('q1, b, x -> q2, &')
+        m.add_transition('q2, b, x -> q2, &')
+        m.add_transition('q2, c, & -> q3, x')
+        m.add_transition('q3, &, x -> q4, &') # useless
+        g = to_grammar(m)
+        # Every nonterminal is reachable and productive
+        self.assertEqual(len(g.remove_useless().rules), len(g.rules))
+        self.assertEqual(len(g.rules), 26)
+        for w in ['a b c', 'a a b b c']:
+            any_parse(g, w)
+        for w in ['a b', 'a b b c', 'c']:
+            self.assertRaises(ValueError, lambda: any_parse(g, w))
+
+class TestParse(unittest.TestCase):
+    def test_parse(self):
+        g = Grammar.from_lines(['S -> a S b', 'S -> &'])
+        self.assertEqual(tree_to_str(only_parse(g, 'a a b b')),
+                         '(S a (S a (S ε) b) b)')
+        self.assertRaises(ValueError, lambda: only_parse(g, 'a b b'))
+        self.assertRaises(ValueError, lambda: any_parse(g, 'a'))
+        self.assertEqual(list(all_parses(g, 'b')), [])
+
+    def test_ambiguous(self):
+        g = Grammar.from_lines(['S -> S S', 'S -> a'])
+        self.assertRaises(ValueError, lambda: only_parse(g, 'a a a'))
+        self.assertIn(tree_to_str(any_parse(g, 'a a a')),
+                      {'(S (S (S a) (S a)) (S a))', '(S (S a) (S (S a) (S a)))'})
+        self.assertEqual({tree_to_str(t) for t in all_parses(g, 'a a a')},
+                         {'(S (S (S a) (S a)) (S a))', '(S (S a) (S (S a) (S a)))'})
+
+    def test_nullable(self):
+        g = Grammar.from_lines(['S -> A A x', 'A -> B', 'A -> &', 'B -> &'])
+        self.assertEqual({tree_to_str(t) for t in all_parses(g, 'x')},
+                         {'(S (A ε) (A ε) x)', '(S (A (B ε)) (A ε) x)',
+                          '(S (A ε) (A (B ε)) x)', '(S (A (B ε)) (A (B ε)) x)'})
+
+    def test_cyclic(self):
+        g = Grammar.from_lines(['S -> &', 'S -> S S B', 'A -> &', 'B -> &', 'B -> a a A'])
+        self.assertEqual(EarleyChart(g, 'a a').get_completions('S', 0, 2), [1])
+        self.assertIn(tree_to_str(any_parse(g, 'a a')),
+                      {tree_to_str(t) for t in all_parses(g, 'a a')})
+        g = Grammar.from_lines(['S -> S', 'S -> a'])
+        self.assertEqual(tree_to_str(any_parse(g, 'a')), '(S a)')
+
+    def test_forest(self):
+        g = Grammar.from_lines(['S -> S S', 'S -> a'])
+        forest = all_parses(g, ['a'] * 10)
+        self.assertEqual(forest.count(), 4862) # Catalan number C_9
+        self.assertEqual(len({tree_to_str(forest[t]) for t in range(0, 4862, 100)}), 49)
+        self.assertEqual(tree_to_str(forest[-1]), tree_to_str(forest[4861]))
+        self.assertRaises(IndexError, lambda: forest[4862])
+
+        # Many parses, counted without enumerating them
+        self.assertEqual(all_parses(g, ['a'] * 60).count(),
+                         405944995127576985730643443367112) # C_59
+
+        # Cyclic grammar: infinitely many parses, but only finitely many are kept
+        g = Grammar.from_lines(['S -> S', 'S -> a'])
+        self.assertEqual([tree_to_str(t) for t in all_parses(g, 'a')], ['(S a)'])
+        self.assertEqual(all_parses(g, 'b').count(), 0)
+
+    def test_long(self):
+        # Right recursion, handled in linear time
+        g = Grammar.from_lines(['S -> a S', 'S -> &'])
+        t = only_parse(g, ['a'] * 1000)
+        depth = 0
+        while len(t.children) > 1:
+            t = t.children[1]
+            depth += 1
+        self.assertEqual(depth, 1000)
+
+        # Left recursion
+        g = Grammar.from_lines(['S -> S a', 'S -> a'])
+        t = only_parse(g, ['a'] * 1000)
+        self.assertEqual(t.label, 'S')
+
+    def test_cyk(self):
+        g = Grammar.from_lines(['S -> A x B', 'A -> a A', 'A -> &', 'B -> B b', 'B -> A'])
+        cnf = g.to_cnf()
+        for [lhs], rhs in cnf.rules:
+            if len(rhs) == 2:
+                self.assertTrue(all(x in cnf.nonterminals for x in rhs))
+                self.assertNotIn(cnf.start_nonterminal, rhs)
+            elif len(rhs) == 1:
+                self.assertNotIn(rhs[0], cnf.nonterminals)
+            else:
+                self.assertEqual(lhs, cnf.start_nonterminal)
+        for w in ['x', 'a x', 'x a b', 'a a x a b b', 'a', 'x b a', 'b x']:
+            self.assertEqual(CYKChart(cnf, w).accepts(), EarleyChart(g, w).accepts())
+
+        # Trees are given in terms of the original grammar
+        g = Grammar.from_lines(['S -> a S b', 'S -> &'])
+        self.assertEqual(tree_to_str(any_parse(g, 'a a b b', method="cyk")),
+                         '(S a (S a (S ε) b) b)')
+        self.assertEqual(tree_to_str(any_parse(g, [], method="cyk")), '(S ε)')
+        self.assertRaises(ValueError, lambda: any_parse(g, 'a b b', method="cyk"))
+        g = Grammar.from_lines(['S -> A A x', 'A -> B', 'A -> &', 'B -> &'])
+        self.assertIn(tree_to_str(any_parse(g, 'x', method="cyk")),
+                      {tree_to_str(t) for t in all_parses(g, 'x')})
+
+
+        # Long input, without recursion
+        g = Grammar.from_lines(['S -> a S b', 'S -> &'])
+        t = any_parse(g, ['a'] * 500 + ['b'] * 500, method="cyk")
+        depth = 0
+        while len(t.children) > 1:
+            t = t.children[1]
+            depth += 1
+        self.assertEqual(depth, 500)
@@ -0,0 +1,97 @@
+import unittest
+import collections
+import itertools
+import pathlib
+import tock
+
+examples = pathlib.Path(__file__).parent.parent.joinpath('examples')
+
+class TestSample(unittest.TestCase):
+    def test_fa(self):
+        # Nondeterministic, but strings are counted once
+        m = tock.from_regexp("(a|b)* a (a|b)")
+        sampler = tock.Sampler(m, seed=0)
+        self.assertEqual([sampler.count(n) for n in range(6)], [0, 0, 2, 4, 8, 16])
+        counts = collections.Counter(sampler.sample(4, 1600))
+        self.assertEqual(len(counts), 8)
+        for w, c in counts.items():
+            self.assertTrue(tock.run(m, w).has_path())
+            self.assertGreater(c, 150)
+        self.assertRaises(ValueError, lambda: sampler.sample(1))
+
+        m = tock.FiniteAutomaton()
+        m.set_start_state('q')
+        m.add_accept_state('q')
+        m.add_transition('q, [a-z] -> q')
+        sampler = tock.Sampler(m, seed=0)
+        self.assertEqual(sampler.count(3), 26**3)
+        self.assertEqual(len(sampler.sample(100)), 100)
+
+    def test_cfg(self):
+        g = tock.Grammar.from_lines(['S -> l S r S', 'S -> &'])
+        sampler = tock.Sampler(g, seed=0)
+        self.assertEqual([sampler.count(n) for n in range(0, 13, 2)],
+                         [1, 1, 2, 5, 14, 42, 132]) # Catalan numbers
+        self.assertEqual(sampler.count(5), 0)
+        self.assertEqual(tock.sample(g, 0), tock.syntax.String([]))
+        for w in sampler.sample(200, 5):
+            self.assertEqual(len(w), 200)
+            self.assertTrue(tock.grammars.EarleyChart(g, w).accepts())
+        counts = collections.Counter(sampler.sample(6, 500))
+        self.assertEqual(len(counts), 5)
+        self.assertTrue(all(c > 60 for c in counts.values()))
+
+class TestAcceptedStrings(unittest.TestCase):
+    def test_fa(self):
+        m = tock.from_regexp("(a|b)* a (a|b)")
+        ws = [' '.join(w) for w in itertools.islice(tock.accepted_strings(m), 8)]
+        self.assertEqual(ws, ['a a', 'a b', 'a a a', 'a a b', 'b a a', 'b a b', 'a a a a', 'a a a b'])
+        self.assertEqual(len(list(tock.accepted_strings(m, max_length=6))), 2+4+8+16+32)
+
+        # Finite language: the generator stops
+        m = tock.from_regexp("a (b|c) | &")
+        self.assertEqual([' '.join(w) for w in tock.accepted_strings(m)], ['', 'a b', 'a c'])
+
+    def test_cfg(self):
+        # Ambiguous, but each string is listed once
+        g = tock.Grammar.from_lines(['S -> S S', 'S -> l S r', 'S -> &'])
+        ws = [' '.join(w) for w in tock.accepted_strings(g, max_length=6)]
+        self.assertEqual(ws, ['', 'l r', 'l l r r', 'l r l r',
+                              'l l l r r r', 'l l r l r r', 'l l r r l r',
+                              'l r l l r r', 'l r l r l r'])
+        ws = list(itertools.islice(tock.accepted_strings(g), 10000))
+        self.assertEqual(len(set(ws)), 10000)
+
+        g = tock.Grammar.from_lines(['S -> A A', 'A -> a', 'A -> b'])
+        self.assertEqual([' '.join(w) for w in tock.accepted_strings(g)],
+                         ['a a', 'a b', 'b a', 'b b'])
+
+    def test_pda(self):
+        m = tock.read_csv(examples.joinpath('sipser-2-14.csv')) # 0^n 1^n
+        self.assertEqual([' '.join(w) for w in itertools.islice(tock.accepted_strings(m), 3)],
+                         ['0 1', '0 0 1 1', '0 0 0 1 1 1'])
+
+    def test_tm(self):
+        m = tock.read_csv(examples.joinpath('sipser-3-7.csv')) # 0^(2^n)
+        self.assertEqual([len(w) for w in tock.accepted_strings(m, max_length=8, alphabet=['0'])],
+                         [1, 2, 4, 8])
+
+class TestCount(unittest.TestCase):
+    def test_count(self):
+        m = tock.from_regexp("(a|b)* a (a|b)")
+        self.assertEqual(tock.count_accepted(m, 10, upto=True),
+                         [0, 0] + [2**(n-1) for n in range(2, 11)])
+        self.assertEqual(tock.count_accepted(m, 1000), 2**999)
+        self.assertEqual(tock.count_accepted(m, 10**18, modulus=10**9+7),
+                         pow(2, 10**18-1, 10**9+7))
+        self.assertEqual(tock.count_accepted(m, 10, modulus=100, upto=True)[-1], 12)
+
+        # Fibonacci numbers: strings with no two consecutive b's
+        m = tock.from_regexp("(a|b a)* (b|&)")
+        self.assertEqual(tock.count_accepted(m, 10, upto=True),
+                         [1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144])
+        self.assertEqual(tock.count_accepted(m, 300) % 10**9,
+                         tock.count_accepted(m, 300, modulus=10**9))
+
+        m = tock.from_regexp("a b")
+        self.assertEqual(tock.count_accepted(m, 3), 0)
@@ -29,6 +29,15 @@ class TestStore(unittest.TestCase):
         s.add(Store('a b', 1))
         self.assertEqual(len(s), 3)
 
+    def test_immutable(self):
+        import pickle
+        s = Store('a b', 1)
+        self.assertRaises(AttributeError, lambda: setattr(s, 'position', 0))
+        self.assertEqual(pickle.loads(pickle.dumps(s)), s)
+        self.assertEqual(Store._make(s.values, 1), s)
+        self.assertEqual(hash(Store._make(s.values, 1)), hash(s))
+        self.assertNotEqual(Store('a b'), tock.syntax.String('a b'))
+
     def test_sort(self):
         import itertools
         l = [Store('a b', 0), Store('a b', 1), Store('a b c', 0), Store('a b', 1)]
@@ -166,6 +175,40 @@ class TestMachine(unittest.TestCase):
         self.assertFalse(m.is_pushdown())
         self.assertFalse(m.is_turing())
     
+    def test_index(self):
+        m = FiniteAutomaton()
+        m.set_start_state('q1')
+        m.add_accept_state('q2')
+        m.add_transition('q1, a -> q2')
+        self.assertEqual(m.states, {'q1', 'q2'})
+        self.assertEqual(m.alphabet, {'a'})
+        self.assertTrue(m.is_finite())
+
+        # Indexes are updated incrementally
+        m.add_transition('q2, b -> q3')
+        self.assertEqual(m.states, {'q1', 'q2', 'q3'})
+        self.assertEqual(m.alphabet, {'a', 'b'})
+        self.assertEqual(m.get_transitions_from(Configuration('q2, b')),
+                         [Transition('q2, b -> q3, &')])
+
+        # or rebuilt if transitions are modified directly
+        m.transitions.append(Transition('q3, c d -> q1 q2, &'))
+        self.assertEqual(m.alphabet, {'a', 'b', 'c', 'd'})
+        self.assertFalse(m.is_finite())
+        del m.transitions[-1]
+        self.assertTrue(m.is_finite())
+        m.transitions = []
+        self.assertEqual(m.states, set())
+
+        # Assigning a new list of transitions invalidates the index
+        m = FiniteAutomaton()
+        m.set_start_state('q1')
+        m.add_accept_state('q2')
+        self.assertEqual(m.alphabet, set())
+        m.transitions = [Transition('q1, a -> q2, &')]
+        self.assertEqual(m.alphabet, {'a'})
+        self.assertTrue(tock.run(m, 'a').has_path())
+
     def test_pda(self):
         m = PushdownAutomaton()
         
@@ -188,6 +231,23 @@ class TestMachine(unittest.TestCase):
         self.assertTrue(m.is_pushdown())
         self.assertTrue(m.is_deterministic())
         self.assertFalse(m.is_turing())
+
+    def test_conflicts(self):
+        m = PushdownAutomaton()
+        m.set_start_state('q1')
+        m.add_accept_state('q2')
+        m.add_transitions(['q1, a, & -> q1, x',
+                           'q1, b, x -> q1, &',
+                           'q1, &, y -> q2, &',
+                           'q1, b, y -> q2, &',
+                           'q2, a, x -> q2, &',
+                           'q2, a, x y -> q1, &'])
+        self.assertFalse(m.is_deterministic())
+        self.assertEqual(m.get_conflicts(),
+                         [(Configuration('q1, a, &'), Configuration('q1, &, y')),
+                          (Configuration('q1, &, y'), Configuration('q1, b, y')),
+                          (Configuration('q2, a, x'), Configuration('q2, a, x y'))])
+        self.assertEqual(len(m.get_conflicts(limit=1)), 1)
     
     def test_tm(self):
         m = TuringMachine()
@@ -211,6 +271,46 @@ class TestMachine(unittest.TestCase):
         self.assertFalse(m.is_pushdown())
         self.assertTrue(m.is_turing())
         self.assertTrue(m.is_deterministic())
-    
+
+class TestSymbolClass(unittest.TestCase):
+    def test_syntax(self):
+        from tock.syntax import SymbolClass, Symbol, str_to_string
+        c = SymbolClass('[cb-ba]')
+        self.assertEqual(str(c), '[a-c]')
+        self.assertEqual(c, SymbolClass('[a-c]'))
+        self.assertNotEqual(c, Symbol('[a-c]'))
+        self.assertEqual(len({c, Symbol('[a-c]')}), 2)
+        self.assertRaises(ValueError, lambda: SymbolClass('[c-a]'))
+        self.assertIn('b', c)
+        self.assertNotIn('d', c)
+        self.assertNotIn('␣', SymbolClass('[^]'))
+        self.assertEqual(SymbolClass('[^a-c]').nth(0), Symbol('\x00'))
+        self.assertEqual(list(SymbolClass('[x-z]').symbols()), ['x', 'y', 'z'])
+        w = str_to_string('[a-z] b')
+        self.assertIsInstance(w[0], SymbolClass)
+
+    def test_run(self):
+        m = tock.FiniteAutomaton()
+        m.set_start_state('q1')
+        m.add_accept_state('q2')
+        m.add_transitions(['q1, [a-z] -> q2',
+                           'q2, [a-z0-9] -> q2',
+                           'q1, x -> q3',
+                           'q3, [^] -> q2'])
+        self.assertFalse(m.is_deterministic())
+        self.assertTrue(tock.run(m, ['x']).has_path())
+        self.assertTrue(tock.run(m, list('x!')).has_path())
+        self.assertTrue(tock.run(m, list('ab1')).has_path())
+        self.assertFalse(tock.run(m, list('9')).has_path())
+        self.assertFalse(tock.run(m, list('a!')).has_path())
+
+        d = tock.determinize(m)
+        self.assertTrue(d.is_deterministic())
+        self.assertEqual(len(d.states), 3)
+        r = tock.determinize(tock.from_regexp('[a-z] [0-9a-z]* | x [^] [0-9a-z]*'))
+        self.assertTrue(tock.equivalent(d, r))
+        r = tock.determinize(tock.from_regexp('[a-z] [0-9a-z]*'))
+        self.assertEqual(tock.equivalent(d, r, witness=True)[0], False)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,12 +1,34 @@
 import unittest
+import pathlib
 import tock
 
+examples = pathlib.Path(__file__).parent.parent.joinpath('examples')
+
 class TestEquivalence(unittest.TestCase):
     def test_equivalence(self):
         m1 = tock.determinize(tock.from_regexp("((&|1|1 1) 0 0*)* (&|1|1 1)"))
         m2 = tock.determinize(tock.from_regexp("(0|1(0|1 0))*(&|1(1|&))"))
 
         self.assertTrue(tock.equivalent(m1, m2))
+        self.assertEqual(tock.equivalent(m1, m2, witness=True), (True, None))
+
+    def test_inequivalence(self):
+        m1 = tock.determinize(tock.from_regexp("(a|b)* a b"))
+        m2 = tock.determinize(tock.from_regexp("(a|b)* b"))
+        self.assertFalse(tock.equivalent(m1, m2))
+        self.assertEqual(tock.equivalent(m1, m2, witness=True),
+                         (False, tock.syntax.String('b')))
+
+    def test_incomplete(self):
+        m1 = tock.FiniteAutomaton()
+        m1.set_start_state('q1')
+        m1.add_accept_state('q2')
+        m1.add_transitions(['q1, a -> q2'])
+        m2 = tock.determinize(tock.from_regexp("a"))
+        self.assertTrue(tock.equivalent(m1, m2))
+        m2 = tock.determinize(tock.from_regexp("a|a b"))
+        self.assertEqual(tock.equivalent(m1, m2, witness=True),
+                         (False, tock.syntax.String('a b')))
 
 class TestIntersection(unittest.TestCase):
     def test_intersection(self):
@@ -28,3 +50,51 @@ class TestIntersection(unittest.TestCase):
         self.assertEqual(tock.run(m, ['a']*3).has_path(), False)
         self.assertEqual(tock.run(m, ['a']*6).has_path(), True)
 
+    def test_intersection_pda(self):
+        m1 = tock.from_regexp("(0|1)* 1 1")
+        m2 = tock.read_csv(examples.joinpath('sipser-2-14.csv')) # 0^n 1^n
+        m = tock.intersect(m1, m2)
+        self.assertTrue(m.is_pushdown())
+        self.assertTrue(tock.run(m, '0 0 1 1').has_path())
+        self.assertFalse(tock.run(m, '0 1').has_path())
+        self.assertFalse(tock.run(m, '0 0 1').has_path())
+        self.assertFalse(tock.run(m, '0 1 1').has_path())
+
+    def test_intersection_lazy(self):
+        m1 = tock.LazyDFA(tock.from_regexp("(a|b)* a (a|b) (a|b) (a|b) (a|b) (a|b) (a|b) (a|b) (a|b)"))
+        m2 = tock.from_regexp("a* b*")
+        m = tock.intersect(m1, m2)
+        self.assertTrue(tock.run(m, 'a b b b b b b b b').has_path())
+        self.assertTrue(tock.run(m, 'a a b b b b b b b b').has_path())
+        self.assertFalse(tock.run(m, 'b b b b b b b b b').has_path())
+        self.assertFalse(tock.run(m, 'b a b b b b b b b').has_path())
+        self.assertLess(len(m.transitions), 2**9)
+
+class TestLazyDFA(unittest.TestCase):
+    def test_lazy(self):
+        # The DFA for this NFA has 2**11 states
+        m = tock.from_regexp("(a|b)* a (a|b) (a|b) (a|b) (a|b) (a|b) (a|b) (a|b) (a|b) (a|b) (a|b)")
+        dm = tock.LazyDFA(m, cache_size=8)
+        self.assertTrue(dm.accepts("b a b b b b b b b b b b"))
+        self.assertFalse(dm.accepts("a b b b b b b b b b"))
+        self.assertFalse(dm.accepts("a c"))
+        self.assertTrue(tock.run(dm, "a a a a a a a a a a a").has_path())
+        self.assertFalse(tock.run(dm, "b a a a a a a a a a a").has_path())
+        self.assertLessEqual(len(dm._cache), 8)
+        self.assertEqual(dm.alphabet, {'a', 'b'})
+        self.assertIsNone(dm._dfa) # not materialized
+
+    def test_materialize(self):
+        m = tock.from_regexp("(a|b)* a b")
+        dm = tock.LazyDFA(m)
+        self.assertTrue(dm.is_deterministic())
+        self.assertTrue(tock.equivalent(dm, tock.determinize(m)))
+        self.assertEqual(set(dm.states), set(tock.determinize(m).states))
+        self.assertEqual(len(dm.transitions), len(tock.determinize(m).transitions))
+
+class TestPrefix(unittest.TestCase):
+    def test_prefix(self):
+        m = tock.prefix(tock.from_regexp("a b (c|&) d"))
+        for w, accept in [('', True), ('a', True), ('a b', True), ('a b c', True),
+                          ('a b d', True), ('a b c d', True), ('b', False), ('a c', False)]:
+            self.assertEqual(tock.run(m, w.split()).has_path(), accept)
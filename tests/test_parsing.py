@@ -0,0 +1,76 @@
+import unittest
+from tock import *
+from tock.parsing import LL1Table, LRTable
+from .helpers import tree_to_str
+
+class TestLR(unittest.TestCase):
+    def test_expr(self):
+        g = Grammar.from_lines(['E -> E p T', 'E -> T',
+                                'T -> T m F', 'T -> F',
+                                'F -> l E r', 'F -> a'])
+        for method, n in [('lr1', 22), ('lalr1', 12)]:
+            table = LRTable(g, method)
+            self.assertEqual(len(table.states), n)
+            self.assertTrue(table.is_deterministic())
+            self.assertEqual(tree_to_str(table.parse('a p a m a')),
+                             '(E (E (T (F a))) p (T (T (F a)) m (F a)))')
+            self.assertRaises(ValueError, lambda: table.parse('a p'))
+
+            m = table.to_pda()
+            self.assertTrue(m.is_deterministic())
+            self.assertTrue(run(m, 'l a r m a').has_path())
+            self.assertFalse(run(m, 'l a m a').has_path())
+
+    def test_conflicts(self):
+        # LR(1) but not LALR(1)
+        g = Grammar.from_lines(['S -> a A d', 'S -> b B d',
+                                'S -> a B e', 'S -> b A e',
+                                'A -> c', 'B -> c'])
+        self.assertTrue(LRTable(g, 'lr1').is_deterministic())
+        table = LRTable(g, 'lalr1')
+        self.assertFalse(table.is_deterministic())
+        self.assertEqual({(a, len(acts)) for q, a, acts in table.get_conflicts()},
+                         {('d', 2), ('e', 2)})
+        self.assertFalse(table.to_pda().is_deterministic())
+
+        # Ambiguous: conflicts are resolved in favor of shifting
+        g = Grammar.from_lines(['S -> S S', 'S -> a'])
+        table = LRTable(g)
+        self.assertFalse(table.is_deterministic())
+        self.assertEqual(tree_to_str(table.parse('a a a')),
+                         '(S (S a) (S (S a) (S a)))')
+
+    def test_nullable(self):
+        g = Grammar.from_lines(['S -> a S b', 'S -> &'])
+        table = LRTable(g)
+        self.assertTrue(table.is_deterministic())
+        self.assertEqual(tree_to_str(table.parse('a a b b')),
+                         '(S a (S a (S ε) b) b)')
+        self.assertEqual(tree_to_str(table.parse([])), '(S ε)')
+
+class TestLL1(unittest.TestCase):
+    def test_ll1(self):
+        g = Grammar.from_lines(['S -> a S c', 'S -> T', 'T -> b T', 'T -> &'])
+        table = LL1Table(g)
+        self.assertTrue(table.is_deterministic())
+        self.assertEqual(tree_to_str(table.parse('a b b c')),
+                         '(S a (S (T b (T b (T ε)))) c)')
+        self.assertEqual(tree_to_str(table.parse([])), '(S (T ε))')
+        self.assertRaises(ValueError, lambda: table.parse('a b'))
+        self.assertRaises(ValueError, lambda: table.parse('a c c'))
+
+        m = table.to_pda()
+        self.assertTrue(m.is_deterministic())
+        self.assertTrue(run(m, 'a a b c c').has_path())
+        self.assertTrue(run(m, []).has_path())
+        self.assertFalse(run(m, 'a b').has_path())
+
+    def test_conflicts(self):
+        g = Grammar.from_lines(['S -> S a', 'S -> a'])
+        table = LL1Table(g)
+        self.assertFalse(table.is_deterministic())
+        [(x, a, rs)] = table.get_conflicts()
+        self.assertEqual((x, a, rs), ('S', 'a', [0, 1]))
+        self.assertFalse(table.to_pda().is_deterministic())
+        # Left-recursive, so parsing would loop without reading input
+        self.assertRaises(ValueError, lambda: table.parse('a a a'))
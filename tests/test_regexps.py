@@ -8,7 +8,7 @@ class TestRegexpParser(unittest.TestCase):
         a, b, c, d = symbol('a'), symbol('b'), symbol('c'), symbol('d')
         self.cases = [
                 (
-                    '(c ∪ a) (b c ∪ d)*',
+                    '(a ∪ c) (b c ∪ d)*',
                     concatenation([
                         union([c, a]),
                         star(union([concatenation([b, c]), d]))
@@ -33,6 +33,53 @@ class TestRegexpParser(unittest.TestCase):
         self.assertEqual(RegularExpression.from_str('&'), RegularExpression.from_str('ε'))
         self.assertEqual(RegularExpression.from_str('a|b'), RegularExpression.from_str('a∪b'))
 
+    def test_simplify(self):
+        a, b = symbol('a'), symbol('b')
+        self.assertIs(RegularExpression.from_str('a b'), concatenation([a, b]))
+        self.assertEqual(len({RegularExpression.from_str('b | a'), union([a, b])}), 1)
+        self.assertEqual(str(RegularExpression.from_str('b | a | b')), 'a ∪ b')
+        self.assertEqual(str(RegularExpression.from_str('a ∅ | b')), 'b')
+        self.assertEqual(str(RegularExpression.from_str('a & b')), 'a b')
+        self.assertEqual(str(RegularExpression.from_str('(a*)* | &')), 'a*')
+        self.assertEqual(str(RegularExpression.from_str('(& | a)*')), 'a*')
+        self.assertEqual(str(RegularExpression.from_str('∅*')), 'ε')
+        self.assertEqual(RegularExpression.from_str('(a b | a)*').size, 6)
+
+class TestToRegexp(unittest.TestCase):
+    def test_to_regexp(self):
+        for s in ['a b* | b', '(a|b)* a (a|b) (a|b) (a|b)', '&', '∅']:
+            m = tock.determinize(tock.from_regexp(s))
+            e = to_regexp(m)
+            self.assertTrue(tock.equivalent(m, tock.determinize(tock.from_regexp(e))))
+
+    def test_size(self):
+        # A 17-state DFA; a bad elimination order gives over 100,000 nodes
+        m = tock.determinize(tock.from_regexp('(a|b)* a (a|b) (a|b) (a|b)'))
+        e = to_regexp(m)
+        size = 0
+        agenda = [e]
+        while len(agenda) > 0:
+            e = agenda.pop()
+            size += 1
+            if e.op != 'symbol':
+                agenda.extend(e.args)
+        self.assertLess(size, 5000)
+
+class TestFromRegexp(unittest.TestCase):
+    def test_glushkov(self):
+        for s in ['(a|b)* a (a|b)', '(a b* | &)* c', 'a* b* | (c | &) a', '&', '∅', '[a-z] [0-9a-z]*']:
+            m1 = tock.from_regexp(s)
+            m2 = tock.from_regexp(s, method='glushkov')
+            self.assertTrue(tock.equivalent(tock.determinize(m1), tock.determinize(m2)))
+            for t in m2.get_transitions():
+                self.assertEqual(len(t.lhs[1]), 1)
+
+        # One state per symbol occurrence, plus the start state
+        m = tock.from_regexp('(a|b)* a (a|b)', method='glushkov')
+        self.assertEqual(len(m.states), 6)
+        self.assertEqual(m.get_accept_states(), {'q4', 'q5'})
+        self.assertRaises(ValueError, lambda: tock.from_regexp('a', method='brzozowski'))
+
 if __name__ == '__main__':
     unittest.main()
 
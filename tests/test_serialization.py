@@ -0,0 +1,64 @@
+import unittest
+import pathlib
+import tempfile
+import tock
+
+examples = pathlib.Path(__file__).parent.parent.joinpath('examples')
+
+class TestSerialization(unittest.TestCase):
+    def assertSameMachine(self, m1, m2):
+        self.assertEqual(m1.store_types, m2.store_types)
+        self.assertEqual((m1.state, m1.input), (m2.state, m2.input))
+        self.assertEqual(m1.start_config, m2.start_config)
+        self.assertEqual(m1.accept_configs, m2.accept_configs)
+        self.assertEqual(list(m1.transitions), list(m2.transitions))
+
+    def test_machines(self):
+        for filename in ['sipser-1-4.csv', 'sipser-2-14.csv', 'sipser-3-7.csv']:
+            m = tock.read_csv(examples.joinpath(filename))
+            self.assertSameMachine(m, tock.from_json(tock.to_json(m)))
+            self.assertSameMachine(m, tock.from_bytes(tock.to_bytes(m)))
+
+    def test_symbols(self):
+        m = tock.determinize(tock.from_regexp('[a-z] [^a]* | x'))
+        m2 = tock.from_bytes(tock.to_bytes(m))
+        self.assertSameMachine(m, m2)
+        self.assertTrue(any(isinstance(x, tock.syntax.SymbolClass)
+                            for t in m2.transitions for x in t.lhs[1]))
+        self.assertTrue(tock.run(m2, ['b', 'c']).has_path())
+
+        # A symbol and a SymbolClass with the same text are kept apart
+        m = tock.FiniteAutomaton()
+        m.set_start_state('q')
+        m.add_accept_state('r')
+        m.add_transition([['q'], [tock.syntax.Symbol('[a-c]')]], [['r']])
+        m.add_transition([['q'], [tock.syntax.SymbolClass('[a-c]')]], [['r']])
+        self.assertEqual(len(m.alphabet), 2)
+        m2 = tock.from_json(tock.to_json(m))
+        self.assertSameMachine(m, m2)
+        self.assertEqual(sorted(type(t.lhs[1][0]).__name__ for t in m2.transitions),
+                         ['Symbol', 'SymbolClass'])
+
+    def test_grammar(self):
+        g = tock.Grammar.from_lines(['S -> a S b', 'S -> &'])
+        for g2 in [tock.from_json(tock.to_json(g)), tock.from_bytes(tock.to_bytes(g))]:
+            self.assertEqual(g2.nonterminals, g.nonterminals)
+            self.assertEqual(g2.start_nonterminal, g.start_nonterminal)
+            self.assertEqual(g2.rules, g.rules)
+
+    def test_files(self):
+        m = tock.read_csv(examples.joinpath('sipser-2-14.csv'))
+        with tempfile.TemporaryDirectory() as d:
+            for name in ['m.json', 'm.tock']:
+                filename = pathlib.Path(d).joinpath(name)
+                tock.save(m, filename)
+                self.assertSameMachine(m, tock.load(filename))
+
+    def test_version(self):
+        m = tock.read_csv(examples.joinpath('sipser-1-4.csv'))
+        s = tock.to_json(m).replace('"version":1', '"version":99')
+        self.assertRaises(ValueError, lambda: tock.from_json(s))
+        self.assertRaises(ValueError, lambda: tock.from_bytes(b'CSV,' + tock.to_bytes(m)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from tock.syntax import *
+
+class TestLexer(unittest.TestCase):
+    def test_lex(self):
+        tokens = lex('q1, |- a [a-z] -> q2, ^ x_y // comment')
+        self.assertEqual(tuple(map(str, tokens)), ('q1', ',', '⊢', 'a', '[a-z]', '→', 'q2', ',', '^', 'x_y'))
+        self.assertEqual([type(t) for t in tokens],
+                         [Symbol, Operator, Symbol, Symbol, SymbolClass, Operator,
+                          Symbol, Operator, Operator, Symbol])
+        self.assertIs(lex('a b')[0], lex('b a')[1])
+        self.assertEqual(lex('  '), ())
+        self.assertRaises(ValueError, lambda: lex('a ! b'))
+        self.assertRaises(ValueError, lambda: lex('[a-z'))
+
+    def test_cache(self):
+        x, attrs = str_to_state('>@q1')
+        self.assertEqual((x, attrs), ('q1', {'start': True, 'accept': True}))
+        attrs['start'] = False
+        self.assertEqual(str_to_state('>@q1')[1], {'start': True, 'accept': True})
+        w = str_to_string('a b')
+        w.append('c')
+        self.assertEqual(str_to_string('a b'), ['a', 'b'])
+
+class TestSymbol(unittest.TestCase):
+    def test_intern(self):
+        import pickle
+        a = Symbol('a')
+        self.assertIs(Symbol('a'), a)
+        self.assertIs(Symbol('_'), BLANK)
+        self.assertIs(String('a b')[0], a)
+        self.assertNotEqual(Symbol('b').id, a.id)
+        self.assertIs(pickle.loads(pickle.dumps(a)), a)
+
+        # Non-str arguments, like the states made by determinize
+        q = Symbol(Set(['q1', 'q2']))
+        self.assertIs(Symbol(Set(['q1', 'q2'])), q)
+        self.assertIs(Symbol(str(q)), q)
+        c = SymbolClass('[a-c]')
+        self.assertIs(SymbolClass('[abc]'), c)
+        self.assertEqual(len({a.id, q.id, c.id, Symbol('[a-c]').id}), 4)
+
+        # Symbols that are no longer used are dropped from the table
+        import gc
+        x = Symbol('unused_symbol')
+        self.assertIn('unused_symbol', Symbol.table)
+        del x
+        gc.collect()
+        self.assertNotIn('unused_symbol', Symbol.table)
+        x = SymbolClass('[x-z]')
+        del x
+        gc.collect()
+        self.assertNotIn('[x-z]', SymbolClass.table)
+
+    def test_alphabet(self):
+        alphabet = Alphabet(['b', 'a'])
+        self.assertEqual(alphabet.add('c'), 2)
+        self.assertEqual(alphabet.add('a'), 1)
+        self.assertEqual(len(alphabet), 3)
+        self.assertEqual(alphabet, {'a', 'b', 'c'})
+        self.assertEqual(alphabet.encode(String('c a b')), [2, 1, 0])
+        self.assertEqual(alphabet.decode([1, 1]), String('a a'))
+        self.assertRaises(ValueError, lambda: alphabet.index('d'))
+
+if __name__ == '__main__':
+    unittest.main()
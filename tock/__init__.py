@@ -5,3 +5,6 @@ from .tables import *
 from .graphs import *
 from .regexps import *
 from .grammars import *
+from .parsing import *
+from .languages import *
+from .serialization import *
@@ -1,11 +1,9 @@
 import collections
 import dataclasses
-import random
 import itertools
 from . import machines
 from . import syntax
 from . import operations
-from . import runs
 from . import trees
 
 __all__ = ['Grammar', 'from_grammar', 'to_grammar', 'any_parse', 'only_parse', 'all_parses']
@@ -25,6 +23,12 @@ class Grammar:
             all.update(rhs)
         return all - self.nonterminals
 
+    @property
+    def alphabet(self):
+        """An `Alphabet` of all the symbols used in the grammar, with the
+        nonterminals first, then the terminals, each in sorted order."""
+        return syntax.Alphabet(sorted(self.nonterminals) + sorted(self.terminals))
+
     @classmethod
     def from_file(cls, filename):
         """Read a grammar from a file.
@@ -239,89 +243,403 @@ class Grammar:
                 g.add_rule([lhs], rhs)
         return g
 
-    def compute_nullable(self):
-        """Compute, for every nonterminal and rhs suffix α,
-        whether α ⇒* ε.
+    def _suffix_graph(self):
+        """Number the empty string, every symbol, and every rhs suffix,
+        for use by `compute_nullable`, `compute_first`, and
+        `compute_follow`.
+
+        Returns:
+            - a list of Strings, indexed by id
+            - a list of pairs (head, tail) of ids, or None for strings
+              of length less than 2
+            - a list, for each rule, of the id of the lhs and the ids of
+              the suffixes rhs[i:] for 0 <= i <= len(rhs)
         """
         if not self.is_contextfree():
             raise ValueError("grammar must be context-free")
-        nullable = {syntax.String()}
-        prev_size = None
-        while len(nullable) != prev_size:
-            prev_size = len(nullable)
-            for lhs, rhs in self.rules:
-                for i in reversed(range(len(rhs))):
-                    if rhs[i+1:] in nullable and rhs[i:i+1] in nullable:
-                        nullable.add(rhs[i:])
-                if rhs in nullable:
-                    nullable.add(lhs)
+        strings = [syntax.String()]
+        pairs = [None]
+        ids = {(): 0}
+        def get_id(values):
+            i = ids.get(values)
+            if i is None:
+                if len(values) >= 2:
+                    pair = (get_id(values[:1]), get_id(values[1:]))
+                else:
+                    pair = None
+                i = ids[values] = len(strings)
+                strings.append(syntax.String(values))
+                pairs.append(pair)
+            return i
+        rules = []
+        for lhs, rhs in self.rules:
+            # Shortest first, so that each tail already has an id
+            suffixes = [get_id(rhs.values[i:]) for i in reversed(range(len(rhs)+1))]
+            suffixes.reverse()
+            rules.append((get_id(lhs.values), suffixes))
+        return strings, pairs, rules
+
+    def _nullable_ids(self, graph):
+        strings, pairs, rules = graph
+        # For each id, the ids that depend on it. A rhs suffix depends
+        # on its head and its tail (and is nullable when both are); a
+        # nonterminal depends on its rhss (and is nullable when one is).
+        users = [[] for _ in strings]
+        waiting = [0] * len(strings)
+        for i, pair in enumerate(pairs):
+            if pair is not None:
+                for j in pair:
+                    users[j].append(i)
+                waiting[i] = 2
+        for lhs, suffixes in rules:
+            users[suffixes[0]].append(lhs)
+
+        nullable = [False] * len(strings)
+        nullable[0] = True
+        agenda = [0]
+        while len(agenda) > 0:
+            j = agenda.pop()
+            for i in users[j]:
+                if pairs[i] is not None:
+                    waiting[i] -= 1
+                    if waiting[i] > 0:
+                        continue
+                if not nullable[i]:
+                    nullable[i] = True
+                    agenda.append(i)
         return nullable
 
+    def _first_ids(self, graph, nullable, alphabet):
+        strings, pairs, rules = graph
+        # FIRST(xα) includes FIRST(x), and FIRST(α) if x is nullable;
+        # FIRST(A) includes FIRST(α) for every rule A → α.
+        deps = [[] for _ in strings]
+        first = [0] * len(strings)
+        for i, pair in enumerate(pairs):
+            if pair is not None:
+                head, tail = pair
+                deps[i].append(head)
+                if nullable[head]:
+                    deps[i].append(tail)
+            elif i > 0 and strings[i][0] not in self.nonterminals:
+                first[i] = 1 << alphabet.add(strings[i][0])
+        for lhs, suffixes in rules:
+            deps[lhs].append(suffixes[0])
+        _digraph(first, deps)
+        return first
+
+    def compute_nullable(self):
+        """Compute, for every nonterminal and rhs suffix α,
+        whether α ⇒* ε.
+        """
+        graph = self._suffix_graph()
+        strings = graph[0]
+        return {strings[i] for i, b in enumerate(self._nullable_ids(graph)) if b}
+
     def compute_first(self, nullable=None):
         """Compute, for every terminal, nonterminal, and rhs suffix α, the set of
         terminals b where α ⇒* b γ for some γ.
         """
-        if not self.is_contextfree():
-            raise ValueError("grammar must be context-free")
+        graph = self._suffix_graph()
+        strings = graph[0]
         if nullable is None:
-            nullable = self.compute_nullable()
-        first = {syntax.String(): set()}
-        for lhs, rhs in self.rules:
-            first.setdefault(lhs, set())
-            for i in range(len(rhs)):
-                if rhs[i] not in self.nonterminals:
-                    first.setdefault(rhs[i:i+1], {rhs[i]})
-                first.setdefault(rhs[i:], set())
-
-        changed = True
-        def update(s, x):
-            nonlocal changed
-            n = len(s)
-            s.update(x)
-            if n != len(s):
-                changed = True
-                    
-        while changed:
-            changed = False
-            for lhs, rhs in self.rules:
-                for i in reversed(range(len(rhs))):
-                    update(first[rhs[i:]], first[rhs[i:i+1]])
-                    if rhs[i:i+1] in nullable:
-                        update(first[rhs[i:]], first[rhs[i+1:]])
-                update(first[lhs], first[rhs])
-
-        return first
+            nullable = self._nullable_ids(graph)
+        else:
+            nullable = [s in nullable for s in strings]
+        alphabet = self.alphabet
+        first = self._first_ids(graph, nullable, alphabet)
+        decode = _bits_decoder(alphabet)
+        return {s: decode(b) for s, b in zip(strings, first)}
 
     def compute_follow(self, nullable=None, first=None):
         """Compute, for every nonterminal A, the set of terminals b where 
         S →* γ A b δ for some γ, δ."""
-        if not self.is_contextfree():
-            raise ValueError("grammar must be context-free")
+        graph = self._suffix_graph()
+        strings, pairs, rules = graph
         if nullable is None:
-            nullable = self.compute_nullable()
+            nullable = self._nullable_ids(graph)
+        else:
+            nullable = [s in nullable for s in strings]
+        alphabet = self.alphabet
         if first is None:
-            first = self.compute_first(nullable)
+            first = self._first_ids(graph, nullable, alphabet)
+        else:
+            encode = _bits_encoder(alphabet)
+            first = [encode(first.get(s, ())) for s in strings]
+
+        # Map nonterminals to dense ids
+        ids = {x: i for i, x in enumerate(self.nonterminals)}
+        # For every rule A → α B β, FOLLOW(B) includes FIRST(β), and
+        # FOLLOW(A) if β is nullable.
+        follow = [0] * len(ids)
+        deps = [[] for _ in ids]
+        for lhs, suffixes in rules:
+            [lhs] = strings[lhs]
+            for d in range(len(suffixes)-1):
+                x = strings[suffixes[d]][0]
+                if x in ids:
+                    follow[ids[x]] |= first[suffixes[d+1]]
+                    if nullable[suffixes[d+1]]:
+                        deps[ids[x]].append(ids[lhs])
+        follow[ids[self.start_nonterminal]] |= 1 << alphabet.add('⊣')
+        _digraph(follow, deps)
+        decode = _bits_decoder(alphabet)
+        return {x: decode(follow[i]) for x, i in ids.items()}
+
+    def to_cnf(self):
+        """Returns an equivalent grammar in Chomsky normal form, in which
+        every rule has the form A → B C or A → a, except that the start
+        nonterminal may have a rule S → ε, and does not appear on any
+        rhs.
+
+        The steps are: add a new start nonterminal (if needed), break
+        up long rules, remove ε-rules, remove unit rules, and replace
+        terminals in binary rules with new nonterminals (Sipser (3e),
+        Theorem 2.9, in a different order to avoid blowup). Each rule
+        remembers where it came from, so that `CNFGrammar.original_tree`
+        can turn its parse trees back into parse trees of this grammar.
 
-        follow = {x: set() for x in self.nonterminals}
-        follow[self.start_nonterminal].add('⊣')
-        
+        Returns:
+            CNFGrammar: the new grammar
+        """
+        if not self.is_contextfree():
+            raise ValueError("grammar must be context-free")
+        used = set(self.nonterminals) | self.terminals
+        nonterminals = set(self.nonterminals)
+        def new_nonterminal(name):
+            x = syntax.Symbol(fresh(name, used))
+            used.add(x)
+            nonterminals.add(x)
+            return x
+
+        # A rule is a triple (lhs, rhs, template). The template says how
+        # to build the original tree for the rule (see CNFGrammar).
+        start = self.start_nonterminal
+        rules = []
+        if any(start in rhs for _, rhs in self.rules):
+            start = new_nonterminal(start)
+            rules.append((start, [self.start_nonterminal], [('slot', 0)]))
+
+        # Break up long rules
+        for r, ([lhs], rhs) in enumerate(self.rules):
+            rhs = list(rhs)
+            # If the rule is broken up, the second slot holds the
+            # subtrees from the new nonterminal
+            template = [('tree', lhs, [('slot', i) for i in range(min(len(rhs), 2))])]
+            while len(rhs) > 2:
+                x = new_nonterminal(f'{lhs}_{r}')
+                rules.append((lhs, [rhs[0], x], template))
+                lhs, rhs, template = x, rhs[1:], [('slot', 0), ('slot', 1)]
+            rules.append((lhs, rhs, template))
+
+        # Remove ε-rules, remembering one ε-derivation for each
+        # nullable nonterminal
+        epsilon = {}
         changed = True
-        def update(s, x):
-            nonlocal changed
-            n = len(s)
-            s.update(x)
-            if n != len(s):
-                changed = True
-                    
         while changed:
             changed = False
-            for [lhs], rhs in self.rules:
-                for i in range(len(rhs)):
-                    if rhs[i] in self.nonterminals:
-                        update(follow[rhs[i]], first[rhs[i+1:]])
-                        if rhs[i+1:] in nullable:
-                            update(follow[rhs[i]], follow[lhs])
-        return follow
+            for lhs, rhs, template in rules:
+                if lhs not in epsilon and all(x in epsilon for x in rhs):
+                    epsilon[lhs] = (rhs, template)
+                    changed = True
+        new_rules = []
+        for lhs, rhs, template in rules:
+            for keep in itertools.product([True, False], repeat=len(rhs)):
+                if not all(k or rhs[i] in epsilon for i, k in enumerate(keep)):
+                    continue
+                kept = [i for i, k in enumerate(keep) if k]
+                if len(kept) == 0 and lhs != start:
+                    continue
+                slots = {i: [('slot', j)] for j, i in enumerate(kept)}
+                new_rules.append((lhs, [rhs[i] for i in kept],
+                                  _substitute(template, lambda i: slots.get(i, [('epsilon', rhs[i])]))))
+        rules = new_rules
+
+        # Remove unit rules
+        units = collections.defaultdict(list)
+        by_lhs = collections.defaultdict(list)
+        for lhs, rhs, template in rules:
+            if len(rhs) == 1 and rhs[0] in nonterminals:
+                units[lhs].append((rhs[0], template))
+            else:
+                by_lhs[lhs].append((rhs, template))
+        new_rules = []
+        for x in sorted(nonterminals):
+            # Breadth-first search for the nonterminals that x
+            # derives using only unit rules
+            reach = {x: [('slot', 0)]}
+            agenda = collections.deque([x])
+            while len(agenda) > 0:
+                y = agenda.popleft()
+                for z, template in units[y]:
+                    if z not in reach:
+                        reach[z] = _substitute(reach[y], lambda i: template)
+                        agenda.append(z)
+            for y, unit_template in reach.items():
+                for rhs, template in by_lhs[y]:
+                    new_rules.append((x, rhs, _substitute(unit_template, lambda i: template)))
+        rules = new_rules
+
+        # Replace terminals in binary rules
+        terminal_rules = {}
+        g = CNFGrammar()
+        g.set_start_nonterminal(start)
+        for lhs, rhs, template in rules:
+            if len(rhs) == 2:
+                for i, a in enumerate(rhs):
+                    if a not in nonterminals:
+                        if a not in terminal_rules:
+                            terminal_rules[a] = new_nonterminal(f'T_{a}')
+                            g.add_rule([terminal_rules[a]], [a])
+                            g.templates.append([('slot', 0)])
+                        rhs = rhs[:i] + [terminal_rules[a]] + rhs[i+1:]
+            g.add_rule([lhs], rhs)
+            g.templates.append(template)
+        for x in nonterminals:
+            g.add_nonterminal(x)
+        g.epsilon = epsilon
+        return g
+
+class CNFGrammar(Grammar):
+    """A grammar in Chomsky normal form, made by `Grammar.to_cnf`, that
+    can convert its parse trees to parse trees of the original grammar.
+
+    Each rule has a template, which is a list of items that, when
+    expanded, give the list of original subtrees that the rule stands
+    for. An item is ``('slot', i)``, which expands to the subtrees for
+    rhs[i]; ``('tree', x, items)``, which expands to a tree with root x;
+    or ``('epsilon', x)``, which expands to the subtrees for an
+    ε-derivation of x.
+    """
+    def __init__(self):
+        super().__init__()
+        self.templates = [] #: The template of each rule
+        self.epsilon = {}   #: Nonterminal → (rhs, template) of an ε-derivation
+
+    def _expand(self, template, slots, out):
+        for item in template:
+            if item[0] == 'slot':
+                out.extend(slots[item[1]])
+            elif item[0] == 'tree':
+                children = []
+                self._expand(item[2], slots, children)
+                out.append(trees.Tree(item[1], children or [trees.Tree('ε')]))
+            else:
+                out.extend(self._epsilon_subtrees(item[1]))
+
+    def _epsilon_subtrees(self, x):
+        rhs, template = self.epsilon[x]
+        out = []
+        self._expand(template, [self._epsilon_subtrees(y) for y in rhs], out)
+        return out
+
+    def original_tree(self, derivation):
+        """Converts a derivation in this grammar to a parse tree of the
+        original grammar. A derivation is a pair (r, children), where r
+        is the index of a rule and children is a list of derivations
+        (for nonterminals) and Symbols (for terminals)."""
+        # Number the nodes so that children come after their parents,
+        # then build subtrees in reverse
+        nodes = [derivation]
+        children = []
+        for node in nodes: # nodes grows during loop
+            if isinstance(node, tuple):
+                children.append(range(len(nodes), len(nodes)+len(node[1])))
+                nodes.extend(node[1])
+            else:
+                children.append(None)
+        expanded = [None] * len(nodes)
+        for k in reversed(range(len(nodes))):
+            if children[k] is None:
+                expanded[k] = [trees.Tree(nodes[k])]
+            else:
+                out = []
+                self._expand(self.templates[nodes[k][0]],
+                             [expanded[c] for c in children[k]], out)
+                expanded[k] = out
+        [tree] = expanded[0]
+        return tree
+
+def _substitute(template, f):
+    """Replace each ``('slot', i)`` in `template` by the items in f(i)."""
+    out = []
+    for item in template:
+        if item[0] == 'slot':
+            out.extend(f(item[1]))
+        elif item[0] == 'tree':
+            out.append(('tree', item[1], _substitute(item[2], f)))
+        else:
+            out.append(item)
+    return out
+
+def _digraph(sets, deps):
+    """Given bitsets `sets` and, for each index i, a list `deps[i]` of
+    indices whose bitsets must be included in bitset i, add bits
+    (in place) until all the inclusions hold.
+
+    Each strongly connected component of the dependency graph is
+    visited once, as in: Frank DeRemer and Thomas Pennello, "Efficient
+    computation of LALR(1) look-ahead sets." doi:10.1145/69622.357187
+    """
+    n = len(sets)
+    depth = [0] * n
+    done = n+1
+    stack = []
+    for root in range(n):
+        if depth[root] != 0:
+            continue
+        stack.append(root)
+        depth[root] = len(stack)
+        frames = [(root, len(stack), iter(deps[root]))]
+        while len(frames) > 0:
+            i, d, it = frames[-1]
+            j = next(it, None)
+            if j is None:
+                frames.pop()
+                if depth[i] == d:
+                    # i is the root of a component; pop and finish it
+                    while True:
+                        k = stack.pop()
+                        depth[k] = done
+                        sets[k] = sets[i]
+                        if k == i:
+                            break
+                if len(frames) > 0:
+                    parent = frames[-1][0]
+                    depth[parent] = min(depth[parent], depth[i])
+                    sets[parent] |= sets[i]
+            elif depth[j] == 0:
+                stack.append(j)
+                depth[j] = len(stack)
+                frames.append((j, len(stack), iter(deps[j])))
+            else:
+                depth[i] = min(depth[i], depth[j])
+                sets[i] |= sets[j]
+
+def _bits_encoder(alphabet):
+    """Returns a function that converts a set of symbols to a bitset
+    over `alphabet`, adding symbols to it as needed."""
+    bits = {x: 1 << i for i, x in enumerate(alphabet)}
+    def encode(xs):
+        b = 0
+        for x in xs:
+            if x not in bits:
+                bits[x] = 1 << alphabet.add(x)
+            b |= bits[x]
+        return b
+    return encode
+
+def _bits_decoder(alphabet):
+    """Returns a function that converts a bitset over `alphabet` to a
+    set of symbols."""
+    cache = {}
+    def decode(b):
+        xs = cache.get(b)
+        if xs is None:
+            bits = map('1'.__eq__, reversed(bin(b)))
+            xs = cache[b] = frozenset(itertools.compress(alphabet, bits))
+        return set(xs)
+    return decode
                 
 def zero_pad(n, i):
     return str(i).zfill(len(str(n)))
@@ -343,6 +661,7 @@ def from_grammar(g, mode="topdown"):
           - ``"ll1"``: LL(1) deterministic top-down.
           - ``"lr0"``: LR(0) deterministic bottom-up.
           - ``"lr1"``: LR(1) deterministic bottom-up.
+          - ``"lalr1"``: LALR(1) deterministic bottom-up.
 
     Returns:
         Machine: a PDA equivalent to `g`.
@@ -359,6 +678,8 @@ def from_grammar(g, mode="topdown"):
             return from_cfg_lr0(g)
         elif mode == "lr1":
             return from_cfg_lr1(g)
+        elif mode == "lalr1":
+            return from_cfg_lalr1(g)
         else:
             raise ValueError("unknown mode '{}'".format(mode))
     else:
@@ -385,26 +706,8 @@ def from_cfg_ll1(g):
     """Convert a CFG to a PDA. If the CFG is LL(1), the resulting PDA will
     be deterministic.
     """
-    nullable = g.compute_nullable()
-    first = g.compute_first(nullable)
-    follow = g.compute_follow(nullable, first)
-    terminals = g.terminals
-    
-    m = machines.PushdownAutomaton()
-    m.set_start_state('start')
-    m.add_transition(('start', [], []), ('loop', [g.start_nonterminal, '$']))
-    for [[lhs], rhs] in g.rules:
-        for c in terminals | {END}:
-            if c in first[rhs] or (rhs in nullable and c in follow[lhs]):
-                m.add_transition((c, [], lhs), (c, rhs))
-    for a in terminals:
-        m.add_transition(('loop', a, []), (a, []))
-        m.add_transition((a, [], a), ('loop', []))
-    m.add_transition(('loop', syntax.BLANK, []), (END, [])) # treat blank as endmarker
-    m.add_transition((END, [], '$'), ('accept', []))
-    m.add_accept_state("accept")
-                                
-    return m
+    from .parsing import LL1Table
+    return LL1Table(g).to_pda()
 
 def from_cfg_bottomup(g):
     terminals = g.terminals
@@ -601,32 +904,21 @@ def from_cfg_lr1(g):
     """Convert a CFG to a PDA. If the CFG is LR(1), the resulting PDA
     will be deterministic.
     """
-    terminals = g.terminals
-    
-    m = machines.PushdownAutomaton()
-    m.set_start_state('start')
-    m.add_transition(('start', [], []), ('loop', '$'))
-    # reduce
-    for [[lhs], rhs] in g.rules:
-        for a in terminals | {END}:
-            m.add_transition(('loop', [], [a] + list(reversed(rhs))), ('loop', [a, lhs]))
-    # shift
-    for a in terminals:
-        m.add_transition(('loop', a, []), ('loop', a))
-    m.add_transition(('loop', syntax.BLANK, []), ('loop', END))
-    # accept
-    m.add_transition(('loop', [], [END, g.start_nonterminal, '$']), ('accept', []))
-    m.add_accept_state('accept')
-                                
-    lr = lr_automaton(g, 1)
-    lr = operations.determinize(lr)
-    lr = operations.prefix(lr)
-    lr = renumber_states(lr)
-    
-    return intersect_stack(m, lr)
+    from .parsing import LRTable
+    return LRTable(g, "lr1").to_pda()
+
+def from_cfg_lalr1(g):
+    """Convert a CFG to a PDA. If the CFG is LALR(1), the resulting PDA
+    will be deterministic.
+    """
+    from .parsing import LRTable
+    return LRTable(g, "lalr1").to_pda()
     
 def pda_to_cfg(m):
     """Convert a PDA to a CFG, using the construction of Sipser (3e) Lemma 2.27.
+    Only the useful rules are generated, that is, rules whose
+    nonterminals are reachable from the start nonterminal and generate
+    at least one string.
 
     Arguments:
       m (Machine): automaton to convert, which must be a PDA.
@@ -671,29 +963,77 @@ def pda_to_cfg(m):
             pop[x].append((q, [], [x], accept if x == bottom else empty, []))
         pop[x].append((empty, [], [x], accept if x == bottom else empty, []))
 
+    # Find the pairs (p, q) such that A_{pq} generates some string,
+    # that is, the machine can go from p to q and leave the stack as
+    # it was. Index the transitions to find new pairs from old ones.
+    push_from = collections.defaultdict(list) # p -> (a, u, r)
+    push_into = collections.defaultdict(list) # r -> (p, a, u)
+    pop_from = collections.defaultdict(list)  # (s, u) -> (b, q)
+    pop_into = collections.defaultdict(list)  # (q, u) -> (s, b)
+    for u in stack_alphabet:
+        for p, a, _, r, _ in push[u]:
+            push_from[p].append((a, u, r))
+            push_into[r].append((p, a, u))
+        for s, b, _, q, _ in pop[u]:
+            pop_from[s, u].append((b, q))
+            pop_into[q, u].append((s, b))
+    states = (m.states | {m.get_start_state()} | set(m.get_accept_states()) |
+              {start, accept, empty})
+    ends = {p: set() for p in states}   # p -> {q | (p, q) is productive}
+    starts = {q: set() for q in states} # q -> {p | (p, q) is productive}
+
+    agenda = [(p, p) for p in states]
+    while len(agenda) > 0:
+        p, q = agenda.pop()
+        if q in ends[p]:
+            continue
+        ends[p].add(q)
+        starts[q].add(p)
+        # A_{p'q'} -> a A_{pq} b
+        for p1, _, u in push_into[p]:
+            for _, q1 in pop_from[q, u]:
+                agenda.append((p1, q1))
+        # A_{p'q} -> A_{p'p} A_{pq} and A_{pq'} -> A_{pq} A_{qq'}
+        for p1 in starts[p]:
+            agenda.append((p1, q))
+        for q1 in ends[q]:
+            agenda.append((p, q1))
+
     g = Grammar()
     g.set_start_nonterminal(Tuple((start, accept)))
+    if accept not in ends[start]:
+        return g
 
-    # For each p, q, r, s \in Q, u \in \Gamma, and a, b \in \Sigma_\epsilon,
-    # if \delta(p, a, \epsilon) contains (r, u) and \delta(s, b, u) contains
-    # (q, \epsilon), put the rule A_{pq} -> a A_{rs} b in G.
-    for u in stack_alphabet:
-        for p, a, _, r, _ in push[u]:
-            for s, b, _, q, _ in pop[u]:
-                g.add_nonterminal(Tuple((p,q)))
-                g.add_rule([Tuple((p,q))], list(a) + [Tuple((r,s))] + list(b))
-
-    # For each p, q, r \in Q, put the rule A_{pq} -> A_{pr} A_{rq} in G.
-    for p in m.states:
-        for q in m.states:
-            for r in m.states:
-                g.add_nonterminal(Tuple((p,q)))
-                g.add_rule([Tuple((p,q))], [Tuple((p,r)), Tuple((r,q))])
-
-    # For each p \in Q, put the rule A_{pp} -> \epsilon in G
-    for p in m.states:
-        g.add_nonterminal(Tuple((p,p)))
-        g.add_rule([Tuple((p,p))], [])
+    # Generate rules for A_{pq} only if it is reachable from the start
+    # nonterminal, and only using productive nonterminals on the rhs.
+    visited = {(start, accept)}
+    agenda = [(start, accept)]
+    def visit(p, q):
+        if (p, q) not in visited:
+            visited.add((p, q))
+            agenda.append((p, q))
+    while len(agenda) > 0:
+        p, q = agenda.pop()
+        g.add_nonterminal(Tuple((p,q)))
+
+        # For each p, q, r, s \in Q, u \in \Gamma, and a, b \in \Sigma_\epsilon,
+        # if \delta(p, a, \epsilon) contains (r, u) and \delta(s, b, u) contains
+        # (q, \epsilon), put the rule A_{pq} -> a A_{rs} b in G.
+        for a, u, r in push_from[p]:
+            for s, b in pop_into[q, u]:
+                if s in ends[r]:
+                    g.add_rule([Tuple((p,q))], list(a) + [Tuple((r,s))] + list(b))
+                    visit(r, s)
+
+        # For each p, q, r \in Q, put the rule A_{pq} -> A_{pr} A_{rq} in G.
+        for r in sorted(ends[p] & starts[q]):
+            g.add_rule([Tuple((p,q))], [Tuple((p,r)), Tuple((r,q))])
+            visit(p, r)
+            visit(r, q)
+
+        # For each p \in Q, put the rule A_{pp} -> \epsilon in G
+        if p == q:
+            g.add_rule([Tuple((p,p))], [])
 
     return g
 
@@ -701,79 +1041,641 @@ def to_grammar(m):
     if m.is_pushdown():
         return pda_to_cfg(m)
 
-def pda_paths(r):
-    # To do: move to runs.py
-    # Index the edges of r in reverse
-    ants = collections.defaultdict(list)
-    for u in r.edges:
-        for v in r.edges[u]:
-            for e in r.edges[u][v]:
-                ants[v].append((e, u))
-
-    def visit(v):
-        axiom = False
-        if 'start' in r.nodes[v]:
-            axiom = True
-        else:
-            assert len(ants[v]) > 0
-            for e, u in ants[v]:
-                if 'prev' in e:
-                    for p1 in visit(e['prev']):
-                        for p2 in visit(u):
-                            yield p1 + p2
-                elif 'transition' in e:
-                    for p in visit(u):
-                        yield p + [e['transition']]
+class EarleyChart:
+    """The chart built by the Earley algorithm for a CFG and an input
+    string. It is a compact representation of all the parses of the
+    string, from which trees are read off by `any_parse` and
+    `only_parse`, and a `ParseForest` by `all_parses`.
+
+    The algorithm is based on: Jay Earley, "An efficient context-free
+    parsing algorithm." doi:10.1145/362007.362035, with the treatment of
+    nullable nonterminals from: John Aycock and R. Nigel Horspool,
+    "Practical Earley parsing." doi:10.1093/comjnl/45.6.620, and
+    right recursion from: Joop M. I. M. Leo, "A general context-free
+    parsing algorithm running in linear time on every LR(k) grammar
+    without using lookahead." doi:10.1016/0304-3975(91)90180-A. It takes
+    worst-case cubic time, quadratic time for unambiguous grammars, and
+    linear time for LR(k) grammars.
+
+    Arguments:
+        g (Grammar): a CFG
+        w (String): the input string
+    """
+
+    def __init__(self, g, w):
+        if not g.is_contextfree():
+            raise ValueError("grammar must be context-free")
+        w = self.w = syntax.String(w)
+        n = len(w)
+        self.g = g
+
+        nonterminals = g.nonterminals
+        nullable = g.compute_nullable()
+        nullable = {x for x in nonterminals if syntax.String([x]) in nullable}
+        self._nullable = nullable
+        self.rules = rules = [(lhs[0], rhs.values) for lhs, rhs in g.rules]
+        by_lhs = collections.defaultdict(list)
+        for r, (lhs, rhs) in enumerate(rules):
+            by_lhs[lhs].append(r)
+
+        # An item (r, d, i) in items[j] means that the first d symbols
+        # of the rhs of rule r derive w[i:j]. It maps to an ordered set of
+        # backpointers (k, x), which means that the first d-1 symbols
+        # derive w[i:k] and the d'th derives w[k:j]. If x is None, the
+        # d'th symbol is a terminal.
+        self.items = items = [{} for j in range(n+1)]
+
+        # completions[j][A, i] lists the rules r such that A → rhs(r)
+        # and rhs(r) derives w[i:j]. An entry can also be a pair (B, k),
+        # which stands for a chain of rules skipped by Leo's optimization
+        # (see `get_completions`).
+        self.completions = completions = [{} for j in range(n+1)]
+
+        # waiting[j][B] lists the items in items[j] with B after the dot.
+        self.waiting = waiting = [{} for j in range(n+1)]
+        self._leo_tops = {}
+
+        for j in range(n+1):
+            agenda = list(items[j])
+            def add(item, bp):
+                bps = items[j].get(item)
+                if bps is None:
+                    bps = items[j][item] = {}
+                    agenda.append(item)
+                if bp is not None:
+                    bps[bp] = None
+
+            def complete(x, i, entry):
+                entries = completions[j].get((x, i))
+                if entries is not None:
+                    entries.append(entry)
+                    return
+                completions[j][x, i] = [entry]
+                for r1, d1, i1 in list(waiting[i].get(x, ())):
+                    add((r1, d1+1, i1), (i, x))
+
+            if j == 0:
+                for r in by_lhs[g.start_nonterminal]:
+                    add((r, 0, 0), None)
+
+            for item in agenda: # agenda grows during loop
+                r, d, i = item
+                lhs, rhs = rules[r]
+                if d < len(rhs):
+                    x = rhs[d]
+                    if x in nonterminals:
+                        # Predict
+                        if x not in waiting[j]:
+                            waiting[j][x] = []
+                            for r1 in by_lhs[x]:
+                                add((r1, 0, j), None)
+                        waiting[j][x].append(item)
+                        # Skip over nullable nonterminal
+                        if x in nullable:
+                            add((r, d+1, i), (j, x))
+                    elif j < n and syntax.symbol_matches(x, w[j]):
+                        # Scan
+                        bps = items[j+1].setdefault((r, d+1, i), {})
+                        bps[j, None] = None
+                else:
+                    # Complete
+                    top = self._leo_top(lhs, i) if i < j else None
+                    if top is None:
+                        complete(lhs, i, r)
+                    elif (lhs, i) in completions[j]:
+                        completions[j][lhs, i].append(r)
+                    else:
+                        completions[j][lhs, i] = [r]
+                        complete(*top, (lhs, i))
+
+    def _leo_top(self, x, i):
+        """If completing nonterminal `x` starting at `i` can only complete
+        a chain of items, each with one symbol left, return the
+        nonterminal and start position of the last one. Otherwise,
+        return None."""
+        start = (self.g.start_nonterminal, 0)
+        chain = []
+        top = None
+        while (x, i) != start:
+            if (x, i) in self._leo_tops:
+                top = self._leo_tops[x, i] or (x, i)
+                break
+            ws = self.waiting[i].get(x, ())
+            if len(ws) != 1:
+                break
+            r, d, k = ws[0]
+            if d+1 != len(self.rules[r][1]) or (x, i) in chain:
+                break
+            chain.append((x, i))
+            x, i = self.rules[r][0], k
+        if len(chain) == 0:
+            self._leo_tops[x, i] = None
+            return None
+        if top is None:
+            top = (x, i)
+        for xi in chain:
+            self._leo_tops[xi] = top
+        return top
+
+    def get_completions(self, x, i, j):
+        """Returns a list of the rules r such that x → rhs(r) and rhs(r)
+        derives w[i:j]."""
+        entries = self.completions[j].get((x, i), [])
+        filled = False
+        for e, entry in enumerate(entries):
+            if isinstance(entry, tuple):
+                filled = True
+                # Fill in the chain of items skipped by Leo's optimization
+                y, k = entry
+                while True:
+                    [(r, d, l)] = self.waiting[k][y]
+                    self.items[j].setdefault((r, d+1, l), {})[k, y] = None
+                    y, k = self.rules[r][0], l
+                    if (y, k) == (x, i):
+                        break
+                    self.completions[j].setdefault((y, k), [])
+                    if r not in self.completions[j][y, k]:
+                        self.completions[j][y, k].append(r)
+                entries[e] = r
+        if filled:
+            # r may already have been in the list
+            entries[:] = dict.fromkeys(entries)
+        return entries
+
+    def accepts(self):
+        """Returns True iff the grammar generates the input string."""
+        return (self.g.start_nonterminal, 0) in self.completions[len(self.w)]
+
+    def _epsilon_tree(self, x):
+        """Returns a tree for a derivation of ε from nonterminal `x`."""
+        # Choose rules in the order that the nonterminals were found to
+        # be nullable, so that the derivation is finite.
+        if not hasattr(self, '_epsilon_rules'):
+            self._epsilon_rules = {}
+            changed = True
+            while changed:
+                changed = False
+                for r, (lhs, rhs) in enumerate(self.rules):
+                    if (lhs not in self._epsilon_rules and
+                        all(y in self._epsilon_rules for y in rhs)):
+                        self._epsilon_rules[lhs] = r
+                        changed = True
+        rhs = self.rules[self._epsilon_rules[x]][1]
+        return trees.Tree(x, [self._epsilon_tree(y) for y in rhs] or [trees.Tree('ε')])
+
+    def _derivation(self, r, i, j):
+        """Returns the children of the first derivation of rule `r`
+        spanning w[i:j], as a list of terminals and spans (x, k, l)."""
+        children = []
+        d = len(self.rules[r][1])
+        while d > 0:
+            k, x = next(iter(self.items[j][r, d, i]))
+            children.append(self.w[k] if x is None else (x, k, j))
+            d -= 1
+            j = k
+        children.reverse()
+        return children
+
+    def _is_cyclic(self):
+        """Tests whether some nonterminal x derives itself (x ⇒+ x),
+        which can only happen through unit rules and nullable
+        nonterminals."""
+        # Edge x → y if x → α y β where α and β derive ε
+        successors = collections.defaultdict(set)
+        indegree = collections.Counter()
+        for lhs, rhs in self.rules:
+            rest = [y for y in rhs if y not in self._nullable]
+            if len(rest) > 1:
+                continue
+            for y in rest or rhs:
+                if y in self.g.nonterminals and y not in successors[lhs]:
+                    successors[lhs].add(y)
+                    indegree[y] += 1
+        # Remove nodes with no incoming edges until none are left
+        agenda = [x for x in self.g.nonterminals if indegree[x] == 0]
+        removed = 0
+        while len(agenda) > 0:
+            x = agenda.pop()
+            removed += 1
+            for y in successors[x]:
+                indegree[y] -= 1
+                if indegree[y] == 0:
+                    agenda.append(y)
+        return removed < len(self.g.nonterminals)
+
+    def tree(self):
+        """Returns one parse tree.
+
+        Each span is built from the first rule completed over it, and
+        each item from the first backpointer added to it. Unless the
+        grammar is cyclic, the spans get smaller or the nonterminals
+        get further from the start, so the tree is finite. If the
+        grammar is cyclic, see `_finite_tree`."""
+        if not self.accepts():
+            raise ValueError('no parse')
+        if self._is_cyclic():
+            return self._finite_tree()
+        n = len(self.w)
+        root = trees.Tree(self.g.start_nonterminal)
+        agenda = [(root, 0, n)]
+        while len(agenda) > 0:
+            node, i, j = agenda.pop()
+            r = self.get_completions(node.label, i, j)[0]
+            for child in self._derivation(r, i, j):
+                if not isinstance(child, tuple):
+                    node.children.append(trees.Tree(child))
+                elif child[1] == child[2]:
+                    node.children.append(self._epsilon_tree(child[0]))
                 else:
-                    axiom = True
-        if axiom:
-            yield []
+                    x, k, l = child
+                    subtree = trees.Tree(x)
+                    node.children.append(subtree)
+                    agenda.append((subtree, k, l))
+            if len(node.children) == 0:
+                node.children.append(trees.Tree('ε'))
+        return root
+
+    def _finite_tree(self):
+        """Returns one parse tree, for a cyclic grammar.
+
+        Following the first rule completed over each span could go
+        around in a cycle forever. So we first find, bottom-up, which
+        spans and items have a finite derivation, choosing for each one
+        an alternative whose parts were found earlier, and then read
+        the tree off top-down. This visits the whole chart, so it is
+        slower than `tree`."""
+        n = len(self.w)
+        root = (self.g.start_nonterminal, 0, n)
+
+        # Nodes are spans (x, i, j) and items (r, d, i, j). For each
+        # alternative of a node, count the parts that are not yet done.
+        remaining = {}
+        parents = collections.defaultdict(list)
+        alternatives = {}
+        done = []
+        visited = {root}
+        agenda = [root]
+        while len(agenda) > 0:
+            node = agenda.pop()
+            if len(node) == 3:
+                x, i, j = node
+                alts = [((r, len(self.rules[r][1]), i, j),)
+                        for r in self.get_completions(x, i, j)]
+            else:
+                r, d, i, j = node
+                if d == 0:
+                    alts = [()]
+                else:
+                    alts = []
+                    for k, y in self.items[j][r, d, i]:
+                        parts = [(r, d-1, i, k)]
+                        if y is not None and k < j:
+                            parts.append((y, k, j))
+                        alts.append(tuple(parts))
+            alternatives[node] = alts
+            for a, parts in enumerate(alts):
+                remaining[node, a] = len(parts)
+                if len(parts) == 0:
+                    done.append((node, a))
+                for part in parts:
+                    parents[part].append((node, a))
+                    if part not in visited:
+                        visited.add(part)
+                        agenda.append(part)
+
+        choice = {}
+        for node, a in done: # done grows during loop
+            if node in choice:
+                continue
+            choice[node] = a
+            for parent, b in parents[node]:
+                remaining[parent, b] -= 1
+                if remaining[parent, b] == 0:
+                    done.append((parent, b))
 
-    for v in r.nodes:
-        if 'accept' in r.nodes[v]:
-            yield from visit(v)
+        def bp(node):
+            return list(self.items[node[3]][node[:3]])[choice[node]]
 
-def pda_path_to_tree(path, mode='bottomup'):
-    if mode != 'bottomup':
-        raise NotImplementedError
-    stack = []
-    for trans in path:
-        [q], a, x = trans.lhs
-        [r], _, y = trans.rhs
-        if q == r == 'loop':
-            if len(a) == 1:
-                stack.append(trees.Tree(a[0]))
-            elif len(x) == 0:
-                stack.append(trees.Tree(y[0], [trees.Tree('ε')]))
+        root_tree = trees.Tree(root[0])
+        agenda = [(root_tree, root)]
+        while len(agenda) > 0:
+            tree, (x, i, j) = agenda.pop()
+            [item] = alternatives[x, i, j][choice[x, i, j]]
+            r, d, _, _ = item
+            while d > 0:
+                k, y = bp((r, d, i, j))
+                if y is None:
+                    tree.children.append(trees.Tree(self.w[k]))
+                elif k == j:
+                    tree.children.append(self._epsilon_tree(y))
+                else:
+                    subtree = trees.Tree(y)
+                    tree.children.append(subtree)
+                    agenda.append((subtree, (y, k, j)))
+                d -= 1
+                j = k
+            tree.children.reverse()
+            if len(tree.children) == 0:
+                tree.children.append(trees.Tree('ε'))
+        return root_tree
+
+    def is_ambiguous(self):
+        """Returns True iff the input string has more than one parse."""
+        if not self.accepts():
+            return False
+        n = len(self.w)
+        start = (self.g.start_nonterminal, 0, n)
+        visited = {start}
+        agenda = [start]
+        while len(agenda) > 0:
+            x, i, j = agenda.pop()
+            rs = self.get_completions(x, i, j)
+            if len(rs) > 1:
+                return True
+            [r] = rs
+            d = len(self.rules[r][1])
+            while d > 0:
+                bps = self.items[j][r, d, i]
+                if len(bps) > 1:
+                    return True
+                [(k, y)] = bps
+                if y is not None and (y, k, j) not in visited:
+                    visited.add((y, k, j))
+                    agenda.append((y, k, j))
+                d -= 1
+                j = k
+        return False
+
+class ParseForest:
+    """All the parse trees of a string, as a shared packed parse forest:
+    each nonterminal spanning a substring, and each partial rule
+    spanning a substring, is a single node shared by all the trees
+    that contain it.
+
+    The number of trees is computed in polynomial time by `count`, and
+    trees are only built when they are asked for, either by iterating
+    over the forest or by index (``forest[i]``).
+
+    If a nonterminal can derive itself, there are infinitely many
+    parses; the forest leaves out enough of them to make the number
+    finite.
+
+    Arguments:
+        chart (EarleyChart): the chart to read the forest off from
+    """
+
+    def __init__(self, chart):
+        self.chart = chart
+        rules = chart.rules
+
+        # There are two kinds of nodes. A nonterminal node (x, i, j)
+        # means that x derives w[i:j]. Its alternatives are rule nodes.
+        # A rule node (r, d, i, j) means that the first d symbols of the
+        # rhs of rule r derive w[i:j]. Its alternatives are pairs
+        # (left, right), where left is the rule node for the first d-1
+        # symbols (or None if d == 1), and right is the nonterminal node
+        # for the d'th symbol (or None if it is a terminal).
+        self.alternatives = alternatives = {}
+        self.counts = counts = {}
+
+        def children(node):
+            if len(node) == 3:
+                x, i, j = node
+                for r in chart.get_completions(x, i, j):
+                    yield (r, len(rules[r][1]), i, j)
             else:
-                stack[-len(x):] = [trees.Tree(y[0], stack[-len(x):])]
-    assert len(stack) == 1
-    return stack[0]
+                r, d, i, j = node
+                if d == 0:
+                    return
+                for k, y in chart.items[j][r, d, i]:
+                    yield ((r, d-1, i, k) if d > 1 else None,
+                           (y, k, j) if y is not None else None)
+
+        if not chart.accepts():
+            self.root = None
+            return
+        self.root = (chart.g.start_nonterminal, 0, len(chart.w))
+
+        # Depth-first search, dropping alternatives that lead back to
+        # nodes that are still being visited (which is where the
+        # cycles are)
+        active = set()
+        def visit(node):
+            alternatives[node] = []
+            active.add(node)
+            for alt in children(node):
+                subnodes = alt if len(node) == 4 else (alt,)
+                if any(u in active for u in subnodes):
+                    continue
+                alternatives[node].append(alt)
+                for u in subnodes:
+                    if u is not None:
+                        yield u
+
+        stack = [(self.root, visit(self.root))]
+        while len(stack) > 0:
+            node, it = stack[-1]
+            u = next(it, None)
+            if u is None:
+                stack.pop()
+                active.remove(node)
+                if len(node) == 3:
+                    counts[node] = sum(counts[a] for a in alternatives[node])
+                elif node[1] == 0:
+                    counts[node] = 1
+                else:
+                    counts[node] = sum(self._count(left) * self._count(right)
+                                       for left, right in alternatives[node])
+            elif u not in alternatives:
+                stack.append((u, visit(u)))
+
+    def _count(self, node):
+        return 1 if node is None else self.counts[node]
+
+    def count(self):
+        """Returns the number of parse trees."""
+        return 0 if self.root is None else self.counts[self.root]
+
+    def __iter__(self):
+        """Iterates over the parse trees, building each one only when
+        it is reached."""
+        for t in range(self.count()):
+            yield self[t]
+
+    def __getitem__(self, t):
+        """Returns parse tree number `t` (where 0 <= t < self.count()),
+        as a `trees.Tree`."""
+        n = self.count()
+        if t < 0:
+            t += n
+        if not 0 <= t < n:
+            raise IndexError('parse tree index out of range')
+        w = self.chart.w
+        root = trees.Tree(self.root[0])
+        agenda = [(root, self.root, t)]
+        while len(agenda) > 0:
+            tree, node, t = agenda.pop()
+            for item in self.alternatives[node]:
+                if t < self.counts[item]:
+                    break
+                t -= self.counts[item]
+            # Follow the rule node down to its children, right to left
+            children = []
+            while item is not None and item[1] > 0:
+                for left, right in self.alternatives[item]:
+                    c = self._count(left) * self._count(right)
+                    if t < c:
+                        break
+                    t -= c
+                t, u = divmod(t, self._count(right))
+                if right is None:
+                    children.append(trees.Tree(w[item[3]-1]))
+                else:
+                    child = trees.Tree(right[0])
+                    children.append(child)
+                    agenda.append((child, right, u))
+                item = left
+            children.reverse()
+            tree.children = children or [trees.Tree('ε')]
+        return root
+
+class CYKChart:
+    """The chart built by the CYK algorithm for a CFG and an input
+    string. The grammar is first converted to Chomsky normal form (see
+    `Grammar.to_cnf`).
+
+    For each length l and nonterminal A, the chart stores the set of
+    positions i such that A derives w[i:i+l], as a bitset (an int). So
+    each rule A → B C is applied to all positions at once, using one
+    bitwise operation per split point, which takes O(n²) operations on
+    n-bit ints in all. Memory use is at most one n-bit int per length
+    and nonterminal.
+
+    Arguments:
+        g (Grammar): a CFG (or a `CNFGrammar`, to avoid converting again)
+        w (String): the input string
+    """
+
+    def __init__(self, g, w):
+        if not isinstance(g, CNFGrammar):
+            g = g.to_cnf()
+        self.g = g
+        w = self.w = syntax.String(w)
+        n = len(w)
+
+        self.binary = binary = collections.defaultdict(list) # (B, C) -> [(A, r)]
+        self.unary = unary = collections.defaultdict(list)   # A -> [(a, r)]
+        for r, ([lhs], rhs) in enumerate(g.rules):
+            if len(rhs) == 2:
+                binary[rhs[0], rhs[1]].append((lhs, r))
+            elif len(rhs) == 1:
+                unary[lhs].append((rhs[0], r))
+
+        positions = collections.defaultdict(int)
+        for i, a in enumerate(w):
+            positions[a] |= 1 << i
+
+        #: spans[l] maps nonterminals A to bitsets of the positions i
+        #: such that A derives w[i:i+l].
+        self.spans = spans = [{}, {}]
+        if n > 0:
+            for x, rules in unary.items():
+                for a, r in rules:
+                    if isinstance(a, syntax.SymbolClass):
+                        bits = sum(b for c, b in positions.items() if c in a)
+                    else:
+                        bits = positions.get(a, 0)
+                    if bits:
+                        spans[1][x] = spans[1].get(x, 0) | bits
+        for l in range(2, n+1):
+            cur = {}
+            for (y, z), heads in binary.items():
+                bits = 0
+                for k in range(1, l):
+                    left = spans[k].get(y)
+                    if left:
+                        right = spans[l-k].get(z)
+                        if right:
+                            bits |= left & (right >> k)
+                if bits:
+                    for x, r in heads:
+                        cur[x] = cur.get(x, 0) | bits
+            spans.append(cur)
+
+    def accepts(self):
+        """Returns True iff the grammar generates the input string."""
+        start = self.g.start_nonterminal
+        n = len(self.w)
+        if n == 0:
+            return any(len(rhs) == 0 for lhs, rhs in self.g.rules)
+        return bool(self.spans[n].get(start, 0) & 1)
+
+    def tree(self):
+        """Returns one parse tree, in terms of the original grammar."""
+        if not self.accepts():
+            raise ValueError('no parse')
+        g, w, spans = self.g, self.w, self.spans
+        n = len(w)
+        if n == 0:
+            r = next(r for r, (lhs, rhs) in enumerate(g.rules) if len(rhs) == 0)
+            return g.original_tree((r, []))
+
+        by_lhs = collections.defaultdict(list)
+        for (y, z), heads in self.binary.items():
+            for x, r in heads:
+                by_lhs[x].append((r, y, z))
+
+        root = None
+        agenda = [(g.start_nonterminal, 0, n, None)]
+        while len(agenda) > 0:
+            x, i, l, parent = agenda.pop()
+            if l == 1:
+                r = next(r for a, r in self.unary[x] if syntax.symbol_matches(a, w[i]))
+                node = (r, [w[i]])
+            else:
+                r, y, z, k = next((r, y, z, k)
+                                  for r, y, z in by_lhs[x]
+                                  for k in range(1, l)
+                                  if spans[k].get(y, 0) >> i & 1 and
+                                     spans[l-k].get(z, 0) >> (i+k) & 1)
+                node = (r, [None, None])
+                agenda.append((y, i, k, (node, 0)))
+                agenda.append((z, i+k, l-k, (node, 1)))
+            if parent is None:
+                root = node
+            else:
+                parent[0][1][parent[1]] = node
+        return g.original_tree(root)
 
 def only_parse(g, w):
-    m = from_grammar(g, mode='bottomup')
-    r = runs.run_pda(m, w, show_stack=0, keep_nodes=True)
-    paths = list(itertools.islice(pda_paths(r), 2))
-    if len(paths) == 0:
+    """Returns the only parse tree of string `w` according to CFG `g`,
+    raising ValueError if there is no parse or more than one."""
+    chart = EarleyChart(g, w)
+    if not chart.accepts():
         raise ValueError('no parse')
-    elif len(paths) == 1:
-        return pda_path_to_tree(paths[0])
-    else:
+    elif chart.is_ambiguous():
         raise ValueError('more than one possible parse')
-                
-def any_parse(g, w):
-    m = from_grammar(g, mode='bottomup')
-    r = runs.run_pda(m, w, show_stack=0, keep_nodes=True)
-    paths = pda_paths(r)
-    try:
-        path = next(paths)
-    except StopIteration:
-        raise ValueError('no parse')
-    return pda_path_to_tree(path)
+    return chart.tree()
+
+def any_parse(g, w, method="earley"):
+    """Returns a parse tree of string `w` according to CFG `g`, raising
+    ValueError if there is none.
+
+    Arguments:
+        g (Grammar): a CFG
+        w (String): the input string
+        method (str): ``"earley"`` to use `EarleyChart` or ``"cyk"`` to
+          use `CYKChart`
+    """
+    if method == "earley":
+        return EarleyChart(g, w).tree()
+    elif method == "cyk":
+        return CYKChart(g, w).tree()
+    else:
+        raise ValueError(f"unknown method '{method}'")
 
 def all_parses(g, w):
-    m = from_grammar(g, mode='bottomup')
-    r = runs.run_pda(m, w, show_stack=0, keep_nodes=True)
-    paths = pda_paths(r)
-    for path in paths:
-        yield pda_path_to_tree(path)
+    """Returns a `ParseForest` of the parse trees of string `w`
+    according to CFG `g`. Iterating over it yields the trees one at a
+    time, and its `count` method returns how many there are."""
+    return ParseForest(EarleyChart(g, w))
@@ -0,0 +1,616 @@
+"""This module contains functions for counting, sampling, and listing
+the strings in the language of an automaton or grammar."""
+
+import collections
+import heapq
+import itertools
+import math
+import random
+from . import machines
+from . import syntax
+from . import operations
+from . import grammars
+from . import runs
+
+__all__ = ['Sampler', 'sample', 'accepted_strings', 'count_accepted']
+
+# Python multiplies b-bit ints in O(b**_KARATSUBA) time
+_KARATSUBA = math.log2(3)
+
+def _in_order(edges):
+    """Merge a list of (Symbol or SymbolClass, target) pairs into an
+    iterator over (Symbol, target) pairs in order of Symbol."""
+    plain = sorted((a, r) for a, r in edges if not isinstance(a, syntax.SymbolClass))
+    classes = [((b, r) for b in a.symbols())
+               for a, r in edges if isinstance(a, syntax.SymbolClass)]
+    if len(classes) == 0:
+        return iter(plain)
+    return heapq.merge(plain, *classes, key=lambda ar: ar[0])
+
+def _has_cycle(successors):
+    """Test whether the graph given by dict `successors` (node ->
+    iterable of nodes) has a cycle."""
+    color = {}
+    for root in successors:
+        if root in color:
+            continue
+        color[root] = 1
+        stack = [(root, iter(successors[root]))]
+        while len(stack) > 0:
+            u, it = stack[-1]
+            for v in it:
+                if color.get(v) == 1:
+                    return True
+                if v not in color:
+                    color[v] = 1
+                    stack.append((v, iter(successors.get(v, ()))))
+                    break
+            else:
+                color[u] = 2
+                stack.pop()
+    return False
+
+class _FATable:
+    """Counts of the strings of each length accepted by a finite
+    automaton. The automaton is determinized (on the fly, keeping only
+    reachable states), so that strings, not paths, are counted.
+
+    Transitions on SymbolClasses are split into disjoint parts, and a
+    part with k symbols counts as k transitions."""
+
+    def __init__(self, m):
+        if not m.is_finite():
+            raise TypeError("machine must be a finite automaton")
+        index = operations.SubsetIndex(m)
+        numbers = {index.start: 0}
+        self.edges = []  # state number -> [(symbol, weight, state number)]
+        self.accept = [] # state number -> bool
+        agenda = [index.start]
+        while len(agenda) > len(self.edges):
+            bits = agenda[len(self.edges)]
+            edges = []
+            for a, rbits in sorted(index.step_all(bits).items()):
+                if rbits not in numbers:
+                    numbers[rbits] = len(agenda)
+                    agenda.append(rbits)
+                weight = a.size() if isinstance(a, syntax.SymbolClass) else 1
+                edges.append((a, weight, numbers[rbits]))
+            self.edges.append(edges)
+            self.accept.append(bool(bits & index.accept))
+
+        #: counts[n][q] is the number of strings of length n accepted
+        #: starting from state q.
+        self.counts = [[int(f) for f in self.accept]]
+
+    def count(self, n):
+        """The number of strings of length n (from the start state)."""
+        while len(self.counts) <= n:
+            prev = self.counts[-1]
+            self.counts.append([sum(w * prev[r] for _, w, r in edges)
+                                for edges in self.edges])
+        return self.counts[n][0]
+
+    def live(self):
+        """The set of states that can reach an accept state."""
+        predecessors = collections.defaultdict(set)
+        for q, edges in enumerate(self.edges):
+            for _, _, r in edges:
+                predecessors[r].add(q)
+        live = {q for q, f in enumerate(self.accept) if f}
+        agenda = list(live)
+        while len(agenda) > 0:
+            r = agenda.pop()
+            for q in predecessors[r]:
+                if q not in live:
+                    live.add(q)
+                    agenda.append(q)
+        return live
+
+    def max_length(self):
+        """The length of the longest accepted string, or None if there
+        are infinitely many."""
+        live = self.live()
+        successors = {q: {r for _, _, r in self.edges[q] if r in live} for q in live}
+        if _has_cycle(successors):
+            return None
+        # Without cycles, no string is longer than the number of states
+        n = len(live)
+        while n >= 0 and self.count(n) == 0:
+            n -= 1
+        return n
+
+    def strings(self, n):
+        """Generate the accepted strings of length n in lexicographic
+        order, by depth-first search, visiting only prefixes of accepted
+        strings."""
+        if self.count(n) == 0:
+            return
+        counts = self.counts
+        def successors(q, l):
+            return ((a, r) for a, r in _in_order([(a, r) for a, _, r in self.edges[q]])
+                    if counts[l-1][r] > 0)
+        prefix = []
+        stack = [successors(0, n)] if n > 0 else []
+        if n == 0:
+            yield syntax.String([])
+        while len(stack) > 0:
+            try:
+                a, r = next(stack[-1])
+            except StopIteration:
+                stack.pop()
+                if len(prefix) > 0:
+                    prefix.pop()
+                continue
+            prefix.append(a)
+            if len(prefix) == n:
+                yield syntax.String(prefix)
+                prefix.pop()
+            else:
+                stack.append(successors(r, n-len(prefix)))
+
+    def draw(self, n, rng):
+        if self.count(n) == 0:
+            raise ValueError(f"no strings of length {n}")
+        q = 0
+        out = []
+        for l in range(n, 0, -1):
+            i = rng.randrange(self.counts[l][q])
+            for a, w, r in self.edges[q]:
+                c = self.counts[l-1][r]
+                if i < w * c:
+                    if isinstance(a, syntax.SymbolClass):
+                        a = a.nth(i // c)
+                    out.append(a)
+                    q = r
+                    break
+                i -= w * c
+        return syntax.String(out)
+
+class _CFGTable:
+    """Counts of the derivations of strings of each length in a
+    context-free grammar, after conversion to Chomsky normal form.
+    If the grammar is unambiguous, this is also the number of strings."""
+
+    def __init__(self, g):
+        if not isinstance(g, grammars.CNFGrammar):
+            g = g.to_cnf()
+        self.start = g.start_nonterminal
+        self.epsilon = 0          # number of rules S → ε
+        self.terminal = {}        # A -> [(a, weight)]
+        self.binary = {}          # A -> [(B, C)]
+        for [lhs], rhs in g.rules:
+            if len(rhs) == 0:
+                self.epsilon += 1
+            elif len(rhs) == 1:
+                [a] = rhs
+                weight = a.size() if isinstance(a, syntax.SymbolClass) else 1
+                self.terminal.setdefault(lhs, []).append((a, weight))
+            else:
+                self.binary.setdefault(lhs, []).append(tuple(rhs))
+
+        #: counts[n][A] is the number of derivations of strings of
+        #: length n from A (for n > 0).
+        self.counts = [{},
+                       {x: sum(w for _, w in rules) for x, rules in self.terminal.items()}]
+
+    def count(self, n):
+        """The number of derivations of strings of length n (from the
+        start nonterminal)."""
+        if n == 0:
+            return self.epsilon
+        counts = self.counts
+        while len(counts) <= n:
+            l = len(counts)
+            cur = {}
+            for x, rules in self.binary.items():
+                c = 0
+                for y, z in rules:
+                    for k in range(1, l):
+                        cy = counts[k].get(y)
+                        if cy:
+                            cz = counts[l-k].get(z)
+                            if cz:
+                                c += cy * cz
+                if c:
+                    cur[x] = c
+            counts.append(cur)
+        return counts[n].get(self.start, 0)
+
+    def max_length(self):
+        """The length of the longest string, or None if there are
+        infinitely many."""
+        # Find the productive nonterminals
+        productive = set(self.terminal)
+        changed = True
+        while changed:
+            changed = False
+            for x, rules in self.binary.items():
+                if x not in productive and any(y in productive and z in productive
+                                               for y, z in rules):
+                    productive.add(x)
+                    changed = True
+        successors = {x: {y for rhs in self.binary.get(x, ()) if set(rhs) <= productive
+                          for y in rhs}
+                      for x in productive}
+        # Keep only the nonterminals reachable from the start
+        reachable = {self.start} & productive
+        agenda = list(reachable)
+        while len(agenda) > 0:
+            x = agenda.pop()
+            for y in successors.get(x, ()):
+                if y not in reachable:
+                    reachable.add(y)
+                    agenda.append(y)
+        successors = {x: ys for x, ys in successors.items() if x in reachable}
+        if _has_cycle(successors):
+            return None
+        # Without cycles, lengths are bounded, and can be found
+        # in topological order
+        longest = {}
+        for x in self._postorder(successors):
+            longest[x] = max([1] * (x in self.terminal) +
+                             [longest[y] + longest[z]
+                              for y, z in self.binary.get(x, ())
+                              if y in longest and z in longest])
+        return longest.get(self.start, 0 if self.epsilon else -1)
+
+    @staticmethod
+    def _postorder(successors):
+        done = set()
+        for root in successors:
+            if root in done:
+                continue
+            done.add(root)
+            stack = [(root, iter(successors[root]))]
+            while len(stack) > 0:
+                u, it = stack[-1]
+                for v in it:
+                    if v not in done:
+                        done.add(v)
+                        stack.append((v, iter(successors.get(v, ()))))
+                        break
+                else:
+                    stack.pop()
+                    yield u
+
+    def strings(self, n):
+        """Generate the strings of length n in lexicographic order,
+        without repetition.
+
+        This is a depth-first search over prefixes. For each prefix,
+        we keep an Earley-style chart column whose items are
+        nonterminals with a known span (x, i, j), which must derive
+        w[i:j]; only spans with nonzero counts are predicted, so every
+        prefix visited is a prefix of a string in the language. The
+        chart for a prefix extends the chart for its parent, so
+        backtracking just pops columns."""
+        if self.count(n) == 0:
+            return
+        if n == 0:
+            yield syntax.String([])
+            return
+        counts = self.counts
+        root = (self.start, 0, n)
+
+        def predict(nodes, column):
+            """Predict the children of `nodes` in `column`. A column is
+            a pair (waiters, leaves), where waiters maps each node to
+            a set of pairs (parent, z), where z is the right sibling
+            still to be predicted, or None if the node is the right
+            child; and leaves is the set of nonterminals that must
+            derive the next symbol."""
+            waiters, leaves = column
+            agenda = list(nodes)
+            while len(agenda) > 0:
+                node = agenda.pop()
+                x, i, j = node
+                if j - i == 1:
+                    leaves.add(x)
+                    continue
+                for y, z in self.binary.get(x, ()):
+                    for k in range(i+1, j):
+                        if counts[k-i].get(y) and counts[j-k].get(z):
+                            child = (y, i, k)
+                            if child not in waiters:
+                                waiters[child] = set()
+                                agenda.append(child)
+                            waiters[child].add((node, z))
+
+        def scan(columns, a):
+            """Make a new column from the last one by reading `a`."""
+            j = len(columns)
+            column = ({}, set())
+            agenda = [(x, j-1, j) for x in columns[-1][1]
+                      if any(syntax.symbol_matches(b, a) for b, _ in self.terminal[x])]
+            completed = set()
+            while len(agenda) > 0:
+                node = agenda.pop()
+                if node in completed:
+                    continue
+                completed.add(node)
+                for parent, z in columns[node[1]][0].get(node, ()):
+                    if z is None:
+                        agenda.append(parent)
+                    else:
+                        child = (z, j, parent[2])
+                        if child not in column[0]:
+                            column[0][child] = set()
+                            predict([child], column)
+                        column[0][child].add((parent, None))
+            return column
+
+        start = ({root: set()}, set())
+        predict([root], start)
+        def next_symbols(column):
+            symbols = {a for x in column[1] for a, _ in self.terminal[x]}
+            merged = _in_order([(a, None) for a in symbols])
+            return (a for (a, _), _ in itertools.groupby(merged))
+
+        columns = [start]
+        prefix = []
+        stack = [next_symbols(start)]
+        while len(stack) > 0:
+            try:
+                a = next(stack[-1])
+            except StopIteration:
+                stack.pop()
+                if len(prefix) > 0:
+                    prefix.pop()
+                    columns.pop()
+                continue
+            prefix.append(a)
+            if len(prefix) == n:
+                yield syntax.String(prefix)
+                prefix.pop()
+                continue
+            column = scan(columns, a)
+            columns.append(column)
+            stack.append(next_symbols(column))
+
+    def draw(self, n, rng):
+        if self.count(n) == 0:
+            raise ValueError(f"no strings of length {n}")
+        counts = self.counts
+        out = []
+        agenda = [(self.start, n)] if n > 0 else []
+        while len(agenda) > 0:
+            x, l = agenda.pop()
+            i = rng.randrange(counts[l][x])
+            if l == 1:
+                for a, w in self.terminal[x]:
+                    if i < w:
+                        if isinstance(a, syntax.SymbolClass):
+                            a = a.nth(i)
+                        out.append(a)
+                        break
+                    i -= w
+                continue
+            for y, z in self.binary[x]:
+                for k in range(1, l):
+                    c = counts[k].get(y, 0) * counts[l-k].get(z, 0)
+                    if i < c:
+                        break
+                    i -= c
+                else:
+                    continue
+                break
+            # Push right child first so that output is left to right
+            agenda.append((z, l-k))
+            agenda.append((y, k))
+        return syntax.String(out)
+
+class Sampler:
+    """Draws strings of a given length uniformly at random from the
+    language of a finite automaton or context-free grammar, without
+    rejection.
+
+    A table of counts is built for each length, as needed, and kept, so
+    drawing many strings costs little more than drawing one. Each
+    string takes O(n) steps for an automaton (after determinization)
+    and O(n²) steps for a grammar.
+
+    For a grammar, derivations (in Chomsky normal form) are drawn
+    uniformly, so strings are drawn uniformly if the grammar is
+    unambiguous; otherwise, each string is weighted by its number of
+    derivations.
+
+    Arguments:
+        x (Machine or Grammar): a finite automaton or a context-free grammar
+        seed: seed for the random number generator
+    """
+    def __init__(self, x, seed=None):
+        if isinstance(x, machines.Machine):
+            self.table = _FATable(x)
+        elif isinstance(x, grammars.Grammar):
+            self.table = _CFGTable(x)
+        else:
+            raise TypeError("can only sample from a Machine or Grammar")
+        self.random = random.Random(seed)
+
+    def count(self, n):
+        """Returns the number of strings of length `n` (for a grammar,
+        the number of derivations)."""
+        return self.table.count(n)
+
+    def sample(self, n, k=None):
+        """Returns a random `String` of length `n`, or a list of `k` of
+        them (drawn independently). Raises ValueError if there are
+        none."""
+        if k is None:
+            return self.table.draw(n, self.random)
+        return [self.table.draw(n, self.random) for _ in range(k)]
+
+def sample(x, n, k=None, seed=None):
+    """Returns a random string of length `n` (or a list of `k` of them)
+    from the language of finite automaton or context-free grammar `x`.
+    See `Sampler`."""
+    return Sampler(x, seed).sample(n, k)
+
+def _mat_mul(a, b, modulus):
+    """Multiply matrices (lists of lists of nonnegative ints) `a` and
+    `b`, optionally modulo `modulus`.
+
+    Each row of `b` is packed into one int, with each entry in a field
+    wide enough that sums can't overflow into the next field, so that a
+    row of the product is a linear combination of packed rows, which
+    takes |a|² big-int operations instead of |a|³ small ones."""
+    top = max(max(row) for row in a) * max(max(row) for row in b) * len(b)
+    width = top.bit_length() // 8 + 1
+    packed = [int.from_bytes(b''.join(x.to_bytes(width, 'little') for x in row), 'little')
+              for row in b]
+    size = width * len(b[0])
+    out = []
+    for row in a:
+        acc = sum(x * y for x, y in zip(row, packed) if x)
+        acc = acc.to_bytes(size, 'little')
+        acc = [int.from_bytes(acc[i:i+width], 'little') for i in range(0, size, width)]
+        if modulus is not None:
+            acc = [x % modulus for x in acc]
+        out.append(acc)
+    return out
+
+def count_accepted(m, n, modulus=None, upto=False):
+    """Counts the strings of length `n` accepted by finite automaton
+    `m`.
+
+    The automaton is determinized (keeping only states that are
+    reachable and can reach an accept state), so that strings, not
+    paths, are counted. Then the count is the start row of the nth
+    power of the matrix whose (q, r) entry is the number of symbols
+    leading from q to r, summed over the accept columns. The power is
+    computed by repeated squaring, in O(|Q|³ log n) arithmetic
+    operations, using exact (Python int) arithmetic. If it's estimated
+    to be cheaper (for small `n` or large `Q`), the counts are computed
+    one length at a time instead.
+
+    Arguments:
+        m (Machine): a finite automaton
+        n (int): the string length
+        modulus (int): if not None, compute counts modulo `modulus`,
+          which keeps the numbers small
+        upto (bool): if True, return the list of counts for all lengths
+          0 to `n`, computed in one pass over the lengths in
+          O(n |Q| |Σ|) operations. These are the first n+1
+          coefficients of the generating function of the language.
+
+    Returns:
+        int, or list of ints if `upto` is True
+    """
+    table = _FATable(m)
+    live = sorted(table.live())
+    index = {q: i for i, q in enumerate(live)}
+    k = len(live)
+    accept = [table.accept[q] for q in live]
+
+    # For a single length, use matrix powers only if they are cheaper
+    # than going through all lengths, as estimated by the number of
+    # word operations. Exact counts have O(n) bits, so going through
+    # all lengths costs about edges * n * n, and the last (dominating)
+    # squaring costs about k**3 * n**_KARATSUBA.
+    edges = sum(len(table.edges[q]) for q in live)
+    if modulus is None:
+        use_powers = k**3 < edges * n**(2-_KARATSUBA)
+    else:
+        use_powers = k**3 * n.bit_length() < edges * n
+
+    if upto or not use_powers:
+        counts = []
+        v = [0] * k
+        if 0 in index:
+            v[index[0]] = 1
+        for _ in range(n+1):
+            counts.append(sum(x for x, f in zip(v, accept) if f))
+            w = [0] * k
+            for q, x in zip(live, v):
+                if x:
+                    for _, weight, r in table.edges[q]:
+                        if r in index:
+                            w[index[r]] += weight * x
+            if modulus is not None:
+                counts[-1] %= modulus
+                w = [x % modulus for x in w]
+            v = w
+        return counts if upto else counts[n]
+
+    if 0 not in index:
+        return 0
+    matrix = [[0] * k for _ in range(k)]
+    for q in live:
+        for _, weight, r in table.edges[q]:
+            if r in index:
+                matrix[index[q]][index[r]] += weight
+
+    # The start row of matrix**n, times the accept column
+    v = [[int(i == index[0]) for i in range(k)]]
+    while n > 0:
+        if n & 1:
+            v = _mat_mul(v, matrix, modulus)
+        n >>= 1
+        if n > 0:
+            matrix = _mat_mul(matrix, matrix, modulus)
+    count = sum(x for x, f in zip(v[0], accept) if f)
+    if modulus is not None:
+        count %= modulus
+    return count
+
+def accepted_strings(x, max_length=None, steps=1000, alphabet=None):
+    """Generates the strings accepted by machine `x` (or generated by
+    grammar `x`) in shortlex order, that is, shortest first and in
+    lexicographic order within each length, without repetition.
+
+    - For a finite automaton, strings of each length are listed by
+      depth-first search over the automaton determinized by the subset
+      construction (only the reachable subsets, built up front),
+      pruning states that can't reach an accept state in the number of
+      remaining steps.
+    - For a PDA or CFG, the PDA is converted to a CFG and then to
+      Chomsky normal form, and strings are listed by depth-first search
+      using a chart (see `_CFGTable.strings`).
+    - For any other machine (like a Turing machine), all strings over
+      `alphabet` are run, each for at most `steps` steps, and strings
+      not accepted within that many steps are left out.
+
+    In the first two cases, if the language is finite, the generator
+    stops after the last string. Memory use depends only on the length
+    of the current string, not the number of strings listed so far.
+
+    Arguments:
+        x (Machine or Grammar): the machine or grammar
+        max_length (int): if not None, stop after strings of this length
+        steps (int): maximum number of steps to run a Turing machine
+        alphabet: the input alphabet, used only for Turing machines
+          (default: all symbols read from the input, except blank)
+    """
+    if isinstance(x, grammars.Grammar):
+        table = _CFGTable(x)
+    elif isinstance(x, machines.Machine) and x.is_finite():
+        table = _FATable(x)
+    elif isinstance(x, machines.Machine) and x.is_pushdown():
+        table = _CFGTable(grammars.to_grammar(x))
+    elif isinstance(x, machines.Machine):
+        yield from _run_strings(x, max_length, steps, alphabet)
+        return
+    else:
+        raise TypeError("can only list strings of a Machine or Grammar")
+
+    longest = table.max_length()
+    if longest is not None and (max_length is None or longest < max_length):
+        max_length = longest
+    for n in itertools.count():
+        if max_length is not None and n > max_length:
+            return
+        yield from table.strings(n)
+
+def _run_strings(m, max_length, steps, alphabet):
+    if alphabet is None:
+        alphabet = [a for a in m.alphabet
+                    if a != syntax.BLANK and not isinstance(a, syntax.SymbolClass)]
+    alphabet = sorted(alphabet)
+    if len(alphabet) == 0:
+        max_length = 0
+    for n in itertools.count():
+        if max_length is not None and n > max_length:
+            return
+        for w in itertools.product(alphabet, repeat=n):
+            if runs.run(m, w, steps=steps).has_path():
+                yield syntax.String(w)
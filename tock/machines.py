@@ -3,14 +3,12 @@ and associated classes and functions."""
 
 import collections
 import itertools
-import dataclasses
 from . import syntax, settings
 
 __all__ = ['Machine',
            'FiniteAutomaton', 'PushdownAutomaton', 'TuringMachine',
            'BASE', 'STREAM', 'TAPE']
 
-@dataclasses.dataclass(frozen=True, order=True)
 class Store(syntax.String):
     """A string together with a head position. It is used either as a
     store of a Machine or as a pattern to be matched against a store of a
@@ -22,7 +20,8 @@ class Store(syntax.String):
         store (Store or str): Another Store to copy, or a str to convert to a Store
     """
 
-    position: int #: The head position
+    __slots__ = ('position',) #: The head position
+    _fields = ('values', 'position')
 
     def __init__(self, *args):
         if len(args) == 0:
@@ -90,12 +89,11 @@ class Store(syntax.String):
         n = len(self)
         while i+n > len(other) and self[n-1] == syntax.BLANK:
             n -= 1
-        if other.values[i:i+n] != self.values[:n]:
+        if not syntax.symbols_match(self.values[:n], other.values[i:i+n]):
             return False
         return True
     
-@dataclasses.dataclass(frozen=True, order=True)
-class Configuration:
+class Configuration(syntax.Immutable):
     """A configuration, which is essentially a tuple of `Stores`.
 
     Arguments:
@@ -103,8 +101,9 @@ class Configuration:
         config (Configuration or str): Another Configuration to copy, or a str to convert to a Configuration
     """
     
-    stores: tuple #: A tuple of Stores
-    
+    __slots__ = ('stores',) #: A tuple of Stores
+    _fields = ('stores',)
+
     def __init__(self, arg):
         if isinstance(arg, Configuration):
             stores = arg.stores
@@ -138,8 +137,7 @@ class Configuration:
                 return False
         return True
 
-@dataclasses.dataclass(frozen=True, order=True)
-class Transition:
+class Transition(syntax.Immutable):
     """A transition from one `Configuration` to another `Configuration`.
 
     Arguments:
@@ -148,9 +146,9 @@ class Transition:
         transition (Transition or str): Another Transition to copy, or a str to convert to a Transition
     """
 
-    lhs: Configuration #: left-hand side Configuration
-    rhs: Configuration #: right-hand side Configuration
-    
+    __slots__ = ('lhs', 'rhs') #: left-hand side and right-hand side Configurations
+    _fields = ('lhs', 'rhs')
+
     def __init__(self, *args):
         if len(args) == 1:
             arg = args[0]
@@ -165,8 +163,10 @@ class Transition:
                 raise TypeError(f"Can't construct Transition from an object of type {type(arg)}")
         elif len(args) == 2:
             lhs, rhs = args
-            lhs = Configuration(lhs)
-            rhs = Configuration(rhs)
+            if not isinstance(lhs, Configuration):
+                lhs = Configuration(lhs)
+            if not isinstance(rhs, Configuration):
+                rhs = Configuration(rhs)
         else:
             raise TypeError("Invalid arguments to Transition")
         object.__setattr__(self, 'lhs', lhs)
@@ -190,7 +190,7 @@ class Transition:
             # Pad store with blanks to fit x
             while i+n > len(values) and x[len(values)-i] == syntax.BLANK:
                 values.append(syntax.BLANK)
-            if tuple(values[i:i+n]) != x.values:
+            if not syntax.symbols_match(x.values, tuple(values[i:i+n])):
                 raise ValueError("Transition cannot apply")
             values[i:i+n] = y.values
             position = i + y.position
@@ -203,9 +203,9 @@ class Transition:
             while position > 0 and len(values)-1 < position:
                 values.append(syntax.BLANK)
 
-            stores.append(Store(values, position))
+            stores.append(Store._make(tuple(values), position))
 
-        return Configuration(stores)
+        return Configuration._make(tuple(stores))
 
     def __str__(self):
         if len(self.rhs) > 0:
@@ -219,7 +219,6 @@ class Transition:
         else:
             return self.lhs._repr_html_()
 
-@dataclasses.dataclass(frozen=True, order=True)
 class AlignedTransition(Transition):
     """A `Transition` that has an alignment between the lhs and rhs. These
     are generated by `get_transitions` so that even if the number of
@@ -230,21 +229,17 @@ class AlignedTransition(Transition):
     containing the lhs and rhs just for store number `i`.
     """
 
-    transitions: tuple
-    
-    def __init__(self, transitions):
-        object.__setattr__(self, 'transitions', tuple(Transition(t) for t in transitions))
-
-    @staticmethod
-    def _flatten(lol):
-        return list(itertools.chain(*lol))
+    __slots__ = ('transitions',)
+    _fields = ('lhs', 'rhs', 'transitions')
 
-    @property
-    def lhs(self):
-        return Configuration(self._flatten([t.lhs for t in self.transitions]))
-    @property
-    def rhs(self):
-        return Configuration(self._flatten([t.rhs for t in self.transitions]))
+    def __init__(self, transitions):
+        transitions = tuple(t if t.__class__ is Transition else Transition(t)
+                            for t in transitions)
+        object.__setattr__(self, 'transitions', transitions)
+        object.__setattr__(self, 'lhs', Configuration._make(tuple(
+            itertools.chain.from_iterable(t.lhs for t in transitions))))
+        object.__setattr__(self, 'rhs', Configuration._make(tuple(
+            itertools.chain.from_iterable(t.rhs for t in transitions))))
 
     def __len__(self):
         return len(self.transitions)
@@ -256,6 +251,84 @@ class AlignedTransition(Transition):
     def __add__(self, other):
         return AlignedTransition(self.transitions+other.transitions)
 
+class TransitionList(list):
+    """A list of Transitions that counts how many times it has been
+    modified, so that a Machine can tell when its indexes are stale."""
+
+    version = 0
+
+def _counts_modifications(name):
+    method = getattr(list, name)
+    def wrapper(self, *args, **kwargs):
+        self.version += 1
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ['append', 'extend', 'insert', 'remove', 'pop', 'clear',
+              'sort', 'reverse', '__setitem__', '__delitem__',
+              '__iadd__', '__imul__']:
+    setattr(TransitionList, _name, _counts_modifications(_name))
+del _name
+
+class _TransitionIndex:
+    """Facts about a Machine's transitions that would otherwise require
+    a scan over all of them. It is updated by `Machine.add_transition`
+    and rebuilt if the transitions are modified in any other way."""
+
+    def __init__(self, m, transitions):
+        self.store_types = m.store_types
+        self.state = m.state
+        self.input = m.input
+        self.version = transitions.version
+        n = m.num_stores
+
+        self.states = set()
+        self.alphabet = syntax.Alphabet()
+
+        # State -> list of transitions whose lhs has that state, or
+        # None if some lhs has a state that can't be indexed
+        self.outgoing = {} if m.state is not None else None
+
+        # For each store:
+        self.stack = [True] * n    # never moves from position 0
+        self.cell = [True] * n     # reads and writes exactly one symbol
+        self.deletes = [True] * n  # never writes anything
+        self.tape = [True] * n     # never inserts or deletes symbols
+        self.readonly = [True] * n # never changes its contents
+        self.max_lhs = [0] * n     # longest lhs
+
+        for t in transitions:
+            self.add(t)
+
+    def add(self, t):
+        if self.state is not None:
+            lhs, rhs = t.lhs[self.state], t.rhs[self.state]
+            self.states.update(lhs.values[:1])
+            self.states.update(rhs.values[:1])
+            if self.outgoing is not None:
+                if (len(lhs) == 1 and lhs.position == 0 and
+                    lhs.values[0] != syntax.BLANK and
+                    not isinstance(lhs.values[0], syntax.SymbolClass)):
+                    self.outgoing.setdefault(lhs.values[0], []).append(t)
+                else:
+                    self.outgoing = None
+        if self.input is not None:
+            self.alphabet.update(t.lhs[self.input].values)
+
+        for s, (lhs, rhs) in enumerate(zip(t.lhs, t.rhs)):
+            if not lhs.position == rhs.position == 0:
+                self.stack[s] = False
+            if not len(lhs) == len(rhs) == 1:
+                self.cell[s] = False
+            if len(rhs) != 0:
+                self.deletes[s] = False
+            if len(lhs) != len(rhs):
+                self.tape[s] = False
+            if lhs.values != rhs.values:
+                self.readonly[s] = False
+            self.max_lhs[s] = max(self.max_lhs[s], len(lhs))
+
 # Store types.
     
 BASE = "BASE"
@@ -304,6 +377,27 @@ class Machine:
         self.start_config = None              #: The start configuration
         self.accept_configs = set()           #: Set of accept configurations
 
+    @property
+    def transitions(self):
+        """List of transitions. It can be modified directly, although
+        `add_transition` is faster because it updates the machine's
+        indexes instead of invalidating them."""
+        return self._transitions
+    @transitions.setter
+    def transitions(self, transitions):
+        self._transitions = TransitionList(transitions)
+        # The new list's version restarts, so the old index can't be trusted
+        self._transition_index = None
+
+    def _get_transition_index(self):
+        """Return the up-to-date `_TransitionIndex` for this machine."""
+        index = self._transition_index
+        if (index is None or index.version != self._transitions.version or
+            index.store_types != self.store_types or
+            index.state != self.state or index.input != self.input):
+            index = self._transition_index = _TransitionIndex(self, self._transitions)
+        return index
+
     @property
     def num_stores(self):
         """How many stores the Machine has."""
@@ -362,8 +456,28 @@ class Machine:
     def states(self):
         """The set of all possible states."""
         if self.state is None: raise ValueError("This Machine doesn't have a state")
-        return (set(t.lhs[self.state][0] for t in self.transitions) | 
-                set(t.rhs[self.state][0] for t in self.transitions))
+        return set(self._get_transition_index().states)
+
+    @property
+    def alphabet(self):
+        """The `Alphabet` of all symbols read from the input store. The
+        ids of symbols stay the same as long as transitions are only
+        added using `add_transition`. It should not be modified."""
+        if self.input is None: raise ValueError("This Machine doesn't have an input")
+        return self._get_transition_index().alphabet
+
+    def get_transitions_from(self, config):
+        """Return a list of transitions that could possibly match
+        Configuration `config`, namely, those whose state matches the
+        state of `config`. (If the machine doesn't have a state, return
+        all transitions.)"""
+        index = self._get_transition_index()
+        if index.outgoing is None:
+            return self.transitions
+        q = config[self.state]
+        if not 0 <= q.position < len(q):
+            return []
+        return index.outgoing.get(q.values[q.position], [])
 
     def add_transition(self, *args):
         """Add a transition. The argument can either be a `Transition` or a
@@ -426,7 +540,11 @@ class Machine:
         if len(lhs) != len(rhs):
             raise TypeError("Left-hand side and right-hand side must have same number of stores")
 
-        self.transitions.append(Transition(lhs, rhs))
+        t = Transition(lhs, rhs)
+        index = self._get_transition_index()
+        self.transitions.append(t)
+        index.add(t)
+        index.version = self.transitions.version
 
     def add_transitions(self, transitions):
         """Add a list of transitions (see `add_transition`)."""
@@ -486,9 +604,8 @@ class Machine:
         """
         if self.start_config[s].position != 0:
             return False
-        for t in self.transitions:
-            if not t.lhs[s].position == t.rhs[s].position == 0:
-                return False
+        if not self._get_transition_index().stack[s]:
+            return False
         for c in self.accept_configs:
             if c[s].position != 0:
                 return False
@@ -500,10 +617,7 @@ class Machine:
         """
         if not self.has_stack(s):
             return False
-        for t in self.transitions:
-            if not len(t.lhs[s]) == len(t.rhs[s]) == 1:
-                return False
-        return True
+        return self._get_transition_index().cell[s]
 
     def has_input_stream(self, s):
         """Tests whether store `s` is an input stream, that is, it only
@@ -511,9 +625,8 @@ class Machine:
         """
         if not self.has_stack(s):
             return False
-        for t in self.transitions:
-            if len(t.rhs[s]) != 0:
-                return False
+        if not self._get_transition_index().deletes[s]:
+            return False
         for c in self.accept_configs:
             if any(x != syntax.BLANK for x in c[s]):
                 return False
@@ -522,17 +635,11 @@ class Machine:
     def has_tape(self, s):
         """Tests whether store `s` is a tape, that is, it never inserts or
         deletes symbols."""
-        for t in self.transitions:
-            if len(t.lhs[s]) != len(t.rhs[s]):
-                return False
-        return True
+        return self._get_transition_index().tape[s]
 
     def has_readonly(self, s):
         """Tests whether store `s` is read-only."""
-        for t in self.transitions:
-            if t.lhs[s].values != t.rhs[s].values:
-                return False
-        return True
+        return self._get_transition_index().readonly[s]
 
     def is_finite(self):
         """Tests whether machine is a finite automaton."""
@@ -554,27 +661,95 @@ class Machine:
                 self.input == 1 and self.has_tape(1))
 
     def is_deterministic(self, verbose=False):
-        """Tests whether machine is deterministic."""
-        # naive quadratic algorithm
+        """Tests whether machine is deterministic.
+
+        Arguments:
+            verbose (bool): if the machine is not deterministic, print
+              a pair of conflicting transitions.
+        """
+        conflicts = self.get_conflicts(limit=1)
+        if conflicts and verbose:
+            [(t1, t2)] = conflicts
+            print('conflicting transitions:')
+            print(' ', t1)
+            print(' ', t2)
+        return len(conflicts) == 0
+
+    def get_conflicts(self, limit=None):
+        """Return a list of pairs of transition left-hand sides and/or
+        accept configurations that can match the same configuration,
+        which is what makes a machine nondeterministic.
+
+        Arguments:
+            limit (int): stop after finding this many conflicts.
+        """
         patterns = [t.lhs for t in self.transitions] + list(self.accept_configs)
-        for i, t1 in enumerate(patterns):
-            for t2 in patterns[:i]:
-                match = True
-                for in1, in2 in zip(t1, t2):
-                    i = max(-in1.position, -in2.position)
-                    while i+in1.position < len(in1) and i+in2.position < len(in2):
-                        x1 = in1.values[i+in1.position]
-                        x2 = in2.values[i+in2.position]
-                        if x1 != x2:
-                            match = False
-                        i += 1
-                if match:
-                    if verbose:
-                        print('conflicting transitions:')
-                        print(' ', t1)
-                        print(' ', t2)
-                    return False
-        return True
+        n = self.num_stores
+
+        # Only patterns that agree on the symbol under each head can
+        # conflict, so recursively partition the patterns store by store.
+        # Patterns that have no symbol under the head, or a SymbolClass,
+        # are wildcards that have to be compared with everything.
+        def split(ps, s):
+            buckets = collections.defaultdict(list)
+            wild = []
+            for i in ps:
+                store = patterns[i][s]
+                if 0 <= store.position < len(store):
+                    x = store.values[store.position]
+                    if not isinstance(x, syntax.SymbolClass):
+                        buckets[x].append(i)
+                        continue
+                wild.append(i)
+            return buckets, wild
+
+        def within(ps, s):
+            """Candidate pairs within ps."""
+            if len(ps) < 2:
+                return
+            if s == n:
+                yield from itertools.combinations(ps, 2)
+                return
+            buckets, wild = split(ps, s)
+            for b in buckets.values():
+                yield from within(b, s+1)
+                yield from between(b, wild, s+1)
+            yield from within(wild, s+1)
+
+        def between(ps1, ps2, s):
+            """Candidate pairs with one member from ps1 and one from ps2."""
+            if len(ps1) == 0 or len(ps2) == 0:
+                return
+            if s == n:
+                yield from itertools.product(ps1, ps2)
+                return
+            buckets1, wild1 = split(ps1, s)
+            buckets2, wild2 = split(ps2, s)
+            for x, b in buckets1.items():
+                if x in buckets2:
+                    yield from between(b, buckets2[x], s+1)
+                yield from between(b, wild2, s+1)
+            yield from between(wild1, ps2, s+1)
+
+        def overlap(c1, c2):
+            for in1, in2 in zip(c1, c2):
+                i = max(-in1.position, -in2.position)
+                while i+in1.position < len(in1) and i+in2.position < len(in2):
+                    x1 = in1.values[i+in1.position]
+                    x2 = in2.values[i+in2.position]
+                    if syntax.intersect_symbols(x1, x2) is None:
+                        return False
+                    i += 1
+            return True
+
+        conflicts = []
+        for i, j in within(range(len(patterns)), 0):
+            if overlap(patterns[i], patterns[j]):
+                conflicts.append(tuple(sorted((i, j))))
+                if limit is not None and len(conflicts) >= limit:
+                    break
+        conflicts.sort()
+        return [(patterns[i], patterns[j]) for i, j in conflicts]
 
 def from_transitions(transitions, start_state, accept_states):
     """Create a `Machine` from transitions (in the same format returned by
@@ -4,121 +4,408 @@ import collections
 from . import machines
 from . import syntax
 
+class SubsetIndex:
+    """Index of a finite automaton for the subset construction. States
+    are interned as integers, and sets of states are represented as
+    bitsets (Python ints). It is used by `determinize`, `LazyDFA`, and
+    the counting and sampling functions in `tock.languages`.
+
+    Arguments:
+        m (Machine): a finite automaton
+    """
+
+    def __init__(self, m):
+        self.states = []                 # state number -> state
+        self.numbers = {}                # state -> state number
+        self.successors = []             # state number -> {symbol: bitset}
+        self.class_successors = []       # state number -> {SymbolClass: bitset}
+        self.epsilons = []               # state number -> bitset
+        self.alphabet = set()            # Symbols read by transitions
+        self.classes = set()             # SymbolClasses read by transitions
+        self.closures = []               # state number -> epsilon-closure
+
+        for transition in m.get_transitions():
+            [[lstate], read] = transition.lhs
+            [[rstate]] = transition.rhs
+            if len(read) > 1:
+                raise ValueError("multiple input symbols on transition not supported")
+            li = self.number(lstate)
+            rbit = 1 << self.number(rstate)
+            if len(read) == 1:
+                a = read[0]
+                if isinstance(a, syntax.SymbolClass):
+                    self.classes.add(a)
+                    successors = self.class_successors[li]
+                else:
+                    self.alphabet.add(a)
+                    successors = self.successors[li]
+                successors[a] = successors.get(a, 0) | rbit
+            else:
+                self.epsilons[li] |= rbit
+        self.start = self.eclosure(1 << self.number(m.get_start_state()))
+        self.accept = 0
+        for q in m.get_accept_states():
+            self.accept |= 1 << self.number(q)
+
+    def number(self, q):
+        if q not in self.numbers:
+            self.numbers[q] = len(self.states)
+            self.states.append(q)
+            self.successors.append({})
+            self.class_successors.append({})
+            self.epsilons.append(0)
+            self.closures.append(None)
+        return self.numbers[q]
+
+    def bits(self, states):
+        result = 0
+        for q in states:
+            result |= 1 << self.numbers[q]
+        return result
+
+    def members(self, bits):
+        while bits:
+            low = bits & -bits
+            yield low.bit_length()-1
+            bits ^= low
+
+    def eclosure(self, bits):
+        """Find epsilon-closure of a set of states."""
+        result = 0
+        for i in self.members(bits):
+            if self.closures[i] is None:
+                closure = frontier = 1 << i
+                while frontier:
+                    new = 0
+                    for j in self.members(frontier):
+                        new |= self.epsilons[j]
+                    frontier = new & ~closure
+                    closure |= frontier
+                self.closures[i] = closure
+            result |= self.closures[i]
+        return result
+
+    def step(self, bits, a):
+        """Return the set of states reached from `bits` on symbol `a`."""
+        result = 0
+        for i in self.members(bits):
+            result |= self.successors[i].get(a, 0)
+            for c, rbits in self.class_successors[i].items():
+                if a in c:
+                    result |= rbits
+        return self.eclosure(result)
+
+    def step_all(self, bits):
+        """Return a dict mapping each symbol on a transition out of `bits`
+        to the (epsilon-closed) set of states it leads to. If there are
+        transitions on SymbolClasses, they are split into disjoint
+        parts (see `syntax.split_symbols`)."""
+        result = {}
+        has_classes = False
+        for i in self.members(bits):
+            for a, rbits in self.successors[i].items():
+                result[a] = result.get(a, 0) | rbits
+            for a, rbits in self.class_successors[i].items():
+                result[a] = result.get(a, 0) | rbits
+                has_classes = True
+        if not has_classes:
+            return {a: self.eclosure(rbits) for a, rbits in result.items()}
+
+        # Split into disjoint parts, then merge parts that lead to the
+        # same set of states
+        merged = collections.defaultdict(list)
+        for a, rbits in syntax.split_symbols(result).items():
+            merged[self.eclosure(rbits)].append(a)
+        return {a: rbits
+                for rbits, xs in merged.items()
+                for a in syntax.union_symbols(xs)}
+
+    def to_set(self, bits):
+        return syntax.Set(self.states[i] for i in self.members(bits))
+
 def determinize(m):
-    """Determinizes a finite automaton."""
+    """Determinizes a finite automaton.
+
+    If `m` has transitions on SymbolClasses, the transitions out of each
+    state of the result are split so that they read disjoint sets of
+    symbols, and no transitions to the empty set of states are added.
+    """
     if not m.is_finite():
         raise TypeError("machine must be a finite automaton")
 
-    transitions = collections.defaultdict(lambda: collections.defaultdict(set))
-    alphabet = set()
-    for transition in m.get_transitions():
-        [[lstate], read] = transition.lhs
-        [[rstate]] = transition.rhs
-        if len(read) > 1:
-            raise NotSupportedException("multiple input symbols on transition not supported")
-        if len(read) == 1:
-            alphabet.add(read[0])
-        transitions[lstate][tuple(read)].add(rstate)
-
-    def eclosure(states):
-        """Find epsilon-closure of set of states."""
-        states = set(states)
-        frontier = set(states)
-        while len(frontier) > 0:
-            lstate = frontier.pop()
-            for rstate in transitions[lstate][()]:
-                if rstate not in states:
-                    states.add(rstate)
-                    frontier.add(rstate)
-        return states
+    index = SubsetIndex(m)
+    alphabet = sorted(index.alphabet)
+
+    # The transitions are built directly from Stores, which are made
+    # once per state and symbol, and are added all at once so that the
+    # machine's index is only built once.
+    Store = machines.Store._make
+    Configuration = machines.Configuration._make
+    Transition = machines.Transition._make
+    empty = Store((), 0)
+    reads = {}
+
+    # Maps each visited set of states (as a bitset) to its Store
+    visited = {}
+    agenda = []
+    def visit(bits):
+        if bits not in visited:
+            visited[bits] = Store((syntax.Symbol(index.to_set(bits)),), 0)
+            agenda.append(bits)
+        return visited[bits]
+    visit(index.start)
+
+    transitions = []
+    while len(agenda) > 0:
+        lbits = agenda.pop()
+        lstore = visited[lbits]
+        successors = index.step_all(lbits)
+        if len(index.classes) > 0:
+            symbols = [a for a in sorted(successors) if successors[a] != 0]
+        else:
+            symbols = alphabet
+        for a in symbols:
+            if a not in reads:
+                reads[a] = Store((a,), 0)
+            rstore = visit(successors.get(a, 0))
+            transitions.append(Transition(Configuration((lstore, reads[a])),
+                                          Configuration((rstore, empty))))
 
     dm = machines.FiniteAutomaton()
+    dm.set_start_state(visited[index.start][0])
+    dm.transitions = transitions
+    for bits, store in visited.items():
+        if bits & index.accept:
+            dm.add_accept_state(store[0])
 
-    start_state = syntax.Set(eclosure([m.get_start_state()]))
-    dm.set_start_state(start_state)
+    return dm
 
-    frontier = {start_state}
-    visited = set()
-    while len(frontier) > 0:
-        lstates = frontier.pop()
-        if lstates in visited:
-            continue
-        visited.add(lstates)
-        dtransitions = collections.defaultdict(set)
-        for lstate in lstates:
-            for read in alphabet:
-                dtransitions[read] |= transitions[lstate][(read,)]
-        for read in alphabet:
-            rstates = syntax.Set(eclosure(dtransitions[read]))
-            dm.add_transition([[lstates], read], [[rstates]])
-            frontier.add(rstates)
-
-    accept_states = set(m.get_accept_states())
-    for states in visited:
-        if len(states & accept_states) > 0:
-            dm.add_accept_state(states)
+class LazyDFA(machines.Machine):
+    """A deterministic view of a finite automaton, equivalent to
+    ``determinize(m)``, whose states and transitions are computed only
+    when they are first needed.
 
-    return dm
+    Running the machine (see `run`) or using it in `equivalent` only
+    visits the subsets of states that are actually reached. Accessing
+    `transitions`, `accept_configs`, or `states` builds the whole DFA
+    using `determinize`.
 
-def equivalent(m1, m2):
-    """Test whether two DFAs are equivalent, using the Hopcroft-Karp algorithm."""
-    if not m1.is_finite() and m1.is_deterministic():
-        raise TypeError("machine must be a deterministic finite automaton")
-    if not m2.is_finite() and m2.is_deterministic():
-        raise TypeError("machine must be a deterministic finite automaton")
+    Arguments:
+        m (Machine): the finite automaton to determinize.
+        cache_size (int): maximum number of transitions to remember;
+          the least recently used transitions are evicted first.
+    """
 
-    # Index transitions. We use tuples (1,q) and (2,q) to rename apart state sets
-    alphabet = set()
+    def __init__(self, m, cache_size=100000):
+        if not m.is_finite():
+            raise TypeError("machine must be a finite automaton")
+        self.store_types = (machines.BASE, machines.STREAM)
+        self.state = 0
+        self.input = 1
+        self.cache_size = cache_size
+
+        self._subsets = SubsetIndex(m)
+        self._cache = collections.OrderedDict()
+        self._machine = m
+        self._dfa = None
+
+        #: The start state, as a set of states of the original automaton
+        self.start_set = self._subsets.to_set(self._subsets.start)
+        self.start_config = machines.Configuration([[self.start_set], []])
+
+    def step(self, q, a):
+        """Return the state reached from state `q` on input symbol `a`.
+        States are represented as sets of states of the original
+        automaton, starting from `start_set`."""
+        key = (q, a)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        r = self._subsets.to_set(self._subsets.step(self._subsets.bits(q), a))
+        self._cache[key] = r
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return r
+
+    def successors(self, q):
+        """Return a dict mapping each symbol (or SymbolClass) that can be
+        read from state `q` to the state it leads to."""
+        successors = self._subsets.step_all(self._subsets.bits(q))
+        return {a: self._subsets.to_set(rbits) for a, rbits in successors.items()}
+
+    def is_accept_state(self, q):
+        """Return True iff `q` is an accept state."""
+        return bool(self._subsets.bits(q) & self._subsets.accept)
+
+    @property
+    def alphabet(self):
+        """The Symbols and SymbolClasses read by the original automaton,
+        found without building the DFA. (The DFA's own transitions may
+        read smaller SymbolClasses, split so that they are disjoint.)"""
+        return syntax.Alphabet(sorted(self._subsets.alphabet | self._subsets.classes))
+
+    def accepts(self, w):
+        """Return True iff the machine accepts `w`."""
+        q = self.start_set
+        for a in syntax.String(w):
+            q = self.step(q, a)
+        return self.is_accept_state(q)
+
+    def materialize(self):
+        """Return the whole DFA as an ordinary `Machine`."""
+        if self._dfa is None:
+            self._dfa = determinize(self._machine)
+        return self._dfa
+
+    @property
+    def transitions(self):
+        return self.materialize().transitions
+
+    def _get_transition_index(self):
+        return self.materialize()._get_transition_index()
+
+    @property
+    def accept_configs(self):
+        return self.materialize().accept_configs
+
+    def add_transition(self, *args):
+        raise TypeError("can't add transitions to a LazyDFA")
+
+    def is_finite(self):
+        return True
+
+    def is_deterministic(self, verbose=False):
+        return True
+
+def equivalent(m1, m2, witness=False):
+    """Test whether two DFAs are equivalent, using the Hopcroft-Karp
+    algorithm with a union-find data structure.
+
+    The DFAs need not be complete: a missing transition is treated as
+    a transition to a (non-accepting) dead state.
+
+    Arguments:
+        m1 (Machine): a deterministic finite automaton.
+        m2 (Machine): a deterministic finite automaton.
+        witness (bool): if True, also return a distinguishing string.
+
+    Returns:
+        If `witness` is False, True iff `m1` and `m2` are equivalent.
+        If `witness` is True, a pair whose first element is as above
+        and whose second element is a shortest `String` accepted by
+        one machine but not the other (or None if they are equivalent).
+    """
+    for m in [m1, m2]:
+        if not (m.is_finite() and m.is_deterministic()):
+            raise TypeError("machine must be a deterministic finite automaton")
+
+    # Index transitions. We use tuples (1,q) and (2,q) to rename apart
+    # state sets, and (0,None) for the dead state.
+    # A LazyDFA is stepped on demand instead of being indexed.
+    dead = (0, None)
+    labels = set()
     d = {}
-    for t in m1.get_transitions():
-        [[q], a] = t.lhs
-        [[r]] = t.rhs
-        alphabet.add(a)
-        d[(1,q),a] = (1,r)
-    for t in m2.get_transitions():
-        [[q], a] = t.lhs
-        [[r]] = t.rhs
-        alphabet.add(a)
-        d[(2,q),a] = (2,r)
-
-    # Naive union find data structure
-    u = {}
+    classes = collections.defaultdict(list)
+    f = set()
+    lazy = {}
+    for i, m in [(1, m1), (2, m2)]:
+        if isinstance(m, LazyDFA):
+            lazy[i] = m
+            labels.update(m.alphabet)
+            continue
+        for t in m.get_transitions():
+            [[q], a], [[r]] = t.lhs, t.rhs
+            if len(a) != 1:
+                raise ValueError("transitions must read exactly one symbol")
+            [a] = a
+            labels.add(a)
+            if isinstance(a, syntax.SymbolClass):
+                classes[i,q].append((a, (i,r)))
+            else:
+                d[(i,q),a] = (i,r)
+        f.update((i, q) for q in m.get_accept_states())
+
+    # If there are SymbolClasses, split them into disjoint parts and
+    # use one member of each part.
+    alphabet = []
+    for a in sorted(syntax.split_symbols({a: 0 for a in labels})):
+        if isinstance(a, syntax.SymbolClass):
+            a = a.nth(0)
+        alphabet.append(a)
+
+    def step(q, a):
+        if q[0] in lazy:
+            return (q[0], lazy[q[0]].step(q[1], a))
+        if (q, a) in d:
+            return d[q, a]
+        for c, r in classes.get(q, ()):
+            if a in c:
+                return r
+        return dead
+
+    def accepting(q):
+        if q[0] in lazy:
+            return lazy[q[0]].is_accept_state(q[1])
+        return q in f
+
+    # Union find with path compression and union by rank
+    parent = {}
+    rank = {}
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
     def union(x, y):
-        for z in u:
-            if u[z] == x:
-                u[z] = y
-
-    for q in m1.states:
-        u[1,q] = (1,q)
-    for q in m2.states:
-        u[2,q] = (2,q)
-
-    s = []
-
-    s1 = (1,m1.get_start_state())
-    s2 = (2,m2.get_start_state())
+        x, y = find(x), find(y)
+        if x == y:
+            return False
+        if rank.get(x, 0) < rank.get(y, 0):
+            x, y = y, x
+        parent[y] = x
+        if rank.get(x, 0) == rank.get(y, 0):
+            rank[x] = rank.get(x, 0) + 1
+        return True
+
+    s1, s2 = [(i, lazy[i].start_set if i in lazy else m.get_start_state())
+              for i, m in [(1, m1), (2, m2)]]
     union(s1, s2)
-    s.append((s1, s2))
-
-    while len(s) > 0:
-        q1, q2 = s.pop()
+    agenda = [(s1, s2)]
+    result = True
+    while len(agenda) > 0:
+        q1, q2 = agenda.pop()
+        if accepting(q1) != accepting(q2):
+            result = False
+            break
         for a in alphabet:
-            r1 = u[d[q1,a]]
-            r2 = u[d[q2,a]]
-            if r1 != r2:
-                union(r1, r2)
-                s.append((r1, r2))
-
-    cls = {}
-    f = ( {(1, q) for q in m1.get_accept_states()} | 
-          {(2, q) for q in m2.get_accept_states()} )
-
-    for q in u:
-        if u[q] not in cls:
-            cls[u[q]] = q in f
-        elif (q in f) != cls[u[q]]:
-            return False
-    return True
+            r1, r2 = step(q1, a), step(q2, a)
+            if union(r1, r2):
+                agenda.append((r1, r2))
+
+    if not witness:
+        return result
+    if result:
+        return True, None
+
+    # Find a shortest distinguishing string by breadth-first search
+    # over the reachable pairs of the product automaton.
+    pred = {(s1, s2): None}
+    frontier = collections.deque([(s1, s2)])
+    while len(frontier) > 0:
+        q1, q2 = pair = frontier.popleft()
+        if accepting(q1) != accepting(q2):
+            w = []
+            while pred[pair] is not None:
+                pair, a = pred[pair]
+                w.append(a)
+            return False, syntax.String(reversed(w))
+        for a in alphabet:
+            r = (step(q1, a), step(q2, a))
+            if r not in pred:
+                pred[r] = (pair, a)
+                frontier.append(r)
+    assert False
 
 def intersect(m1, m2):
     """Intersect two Machines.
@@ -133,29 +420,80 @@ def intersect(m1, m2):
       is a PDA.
 
     - The intersection of two PDAs would be a two-stack PDA.
+
+    Only the pairs of states that are reachable from the pair of
+    start states are constructed. Either machine can be a `LazyDFA`,
+    whose states are then computed as they are reached.
     """
 
     def make_tuple(*xs):
         return syntax.Tuple(xs)
 
     def is_finite_plus(m):
-        return (m.store_types[:2] == (machines.BASE, machines.STREAM) and
-                m.state == 0 and m.has_cell(0) and
-                m.input == 1 and m.has_input_stream(1))
+        return isinstance(m, LazyDFA) or (
+            m.store_types[:2] == (machines.BASE, machines.STREAM) and
+            m.state == 0 and m.has_cell(0) and
+            m.input == 1 and m.has_input_stream(1))
+
+    def index(m, name):
+        """Returns the start state of `m` and functions that map a state
+        to its outgoing transitions (grouped by input) and its accept
+        configurations. Transitions and accept configurations are
+        given without store 0, and transitions are (lhs, rhs) pairs.
+        Also returns whether `m` reads any SymbolClasses."""
+        if isinstance(m, LazyDFA):
+            def outgoing(q):
+                return {(a,): [(([a],), (r,))] for a, r in m.successors(q).items()}
+            def accepting(q):
+                return [([syntax.BLANK],)] if m.is_accept_state(q) else []
+            has_classes = any(isinstance(a, syntax.SymbolClass) for a in m.alphabet)
+            return m.start_set, outgoing, accepting, has_classes
+
+        has_classes = False
+        transitions = collections.defaultdict(lambda: collections.defaultdict(list))
+        for t in m.transitions:
+            if len(t.lhs[1]) > 1:
+                raise ValueError(f'{name} cannot have multiple input symbols on a transition')
+            [q], [r] = t.lhs[0], t.rhs[0]
+            transitions[q][t.lhs[1].values].append((t.lhs[1:], (r,) + t.rhs[2:]))
+            if any(isinstance(a, syntax.SymbolClass) for a in t.lhs[1]):
+                has_classes = True
+        accept_configs = collections.defaultdict(list)
+        for c in m.accept_configs:
+            [q] = c[0]
+            accept_configs[q].append(c[1:])
+        def outgoing(q):
+            return transitions.get(q, {})
+        def accepting(q):
+            return accept_configs.get(q, [])
+        return m.get_start_state(), outgoing, accepting, has_classes
 
     if not is_finite_plus(m1):
         raise ValueError("m1 must have a state and input stream")
     if not is_finite_plus(m2):
         raise ValueError("m2 must have a state and input stream")
-    for t1 in m1.transitions:
-        if len(t1.lhs[1]) > 1:
-            raise ValueError('m1 cannot have multiple input symbols on a transition')
-    for t2 in m2.transitions:
-        if len(t2.lhs[1]) > 1:
-            raise ValueError('m2 cannot have multiple input symbols on a transition')
+    start1, outgoing1, accepting1, classes1 = index(m1, 'm1')
+    start2, outgoing2, accepting2, classes2 = index(m2, 'm2')
+
+    def matching(out, read):
+        """Yields the inputs of the transitions in `out` that overlap
+        with `read`, intersected with `read`, and the transitions."""
+        if not (classes1 or classes2):
+            if read in out:
+                yield read, out[read]
+            return
+        [a] = read
+        for read2, ts in out.items():
+            if len(read2) == 1:
+                b = syntax.intersect_symbols(a, read2[0])
+                if b is not None:
+                    yield (b,), ts
 
     store_types = ((machines.BASE, machines.STREAM) +
                    m1.store_types[2:] + m2.store_types[2:])
+    # Empty lhs/rhs for the extra stores of a machine that doesn't move
+    empty1 = ([],) * (len(m1.store_types)-2)
+    empty2 = ([],) * (len(m2.store_types)-2)
 
     m = machines.Machine(store_types, state=0, input=1)
 
@@ -164,39 +502,50 @@ def intersect(m1, m2):
         m1.start_config[2:] + m2.start_config[2:]
     )
 
-
-    for c1 in m1.accept_configs:
-        for c2 in m2.accept_configs:
-            m.accept_configs.add(machines.Configuration(
-                ([make_tuple(c1[0][0], c2[0][0])], [syntax.BLANK]) + c1[2:] + c2[2:]
-            ))
-            
-    for t1 in m1.transitions:
-        for t2 in m2.transitions:
-            if t1.lhs[1] == t2.lhs[1] and len(t1.lhs[1]) > 0:
-                m.transitions.append(machines.Transition(
-                    ([make_tuple(t1.lhs[0][0], t2.lhs[0][0])], t1.lhs[1]) + t1.lhs[2:] + t2.lhs[2:],
-                    ([make_tuple(t1.rhs[0][0], t2.rhs[0][0])], []) + t1.lhs[2:] + t2.lhs[2:],
-                ))
-
-    # Handle epsilon transitions. For stores 2 and beyond, we just use
-    # a lhs and rhs of &, whether or not this makes sense for the type
-    # of automaton that m1 and m2 are.
-    for t1 in m1.transitions:
-        if len(t1.lhs[1]) == 0:
-            for q2 in m2.states:
-                m.transitions.append(machines.Transition(
-                    ([make_tuple(t1.lhs[0][0], q2)], []) + ([],)*(m.num_stores-2),
-                    ([make_tuple(t1.rhs[0][0], q2)], []) + ([],)*(m.num_stores-2)
+    # Explore the pairs of states reachable from the start pair
+    start = (start1, start2)
+    visited = {start}
+    agenda = [start]
+    def visit(q1, q2):
+        if (q1, q2) not in visited:
+            visited.add((q1, q2))
+            agenda.append((q1, q2))
+        return [make_tuple(q1, q2)]
+
+    while len(agenda) > 0:
+        q1, q2 = agenda.pop()
+        q = [make_tuple(q1, q2)]
+
+        for c1 in accepting1(q1):
+            for c2 in accepting2(q2):
+                m.accept_configs.add(machines.Configuration(
+                    (q, [syntax.BLANK]) + tuple(c1[1:]) + tuple(c2[1:])
                 ))
 
-    for t2 in m2.transitions:
-        if len(t2.lhs[1]) == 0:
-            for q1 in m1.states:
-                m.transitions.append(machines.Transition(
-                    ([make_tuple(q1, t2.lhs[0][0])], []) + ([],)*(m.num_stores-2),
-                    ([make_tuple(q1, t2.rhs[0][0])], []) + ([],)*(m.num_stores-2)
-                ))
+        out2 = outgoing2(q2)
+        for read, ts1 in outgoing1(q1).items():
+            if len(read) == 0:
+                # Epsilon transitions of m1; m2 stays put
+                for lhs1, rhs1 in ts1:
+                    m.transitions.append(machines.Transition(
+                        (q, []) + tuple(lhs1[1:]) + empty2,
+                        (visit(rhs1[0], q2), []) + tuple(rhs1[1:]) + empty2
+                    ))
+            else:
+                for read12, ts2 in matching(out2, read):
+                    for lhs1, rhs1 in ts1:
+                        for lhs2, rhs2 in ts2:
+                            m.transitions.append(machines.Transition(
+                                (q, read12) + tuple(lhs1[1:]) + tuple(lhs2[1:]),
+                                (visit(rhs1[0], rhs2[0]), []) + tuple(rhs1[1:]) + tuple(rhs2[1:])
+                            ))
+
+        # Epsilon transitions of m2; m1 stays put
+        for lhs2, rhs2 in out2.get((), ()):
+            m.transitions.append(machines.Transition(
+                (q, []) + empty1 + tuple(lhs2[1:]),
+                (visit(q1, rhs2[0]), []) + empty1 + tuple(rhs2[1:])
+            ))
 
     return m
 
@@ -206,18 +555,26 @@ def prefix(m):
     """
     if not m.is_finite():
         raise ValueError('m must be a finite automaton')
+
+    # Index transitions in reverse
+    predecessors = collections.defaultdict(set)
+    for t in m.get_transitions():
+        [[q], _], [[r]] = t.lhs, t.rhs
+        predecessors[r].add(q)
+
+    # Find all states that can reach an accept state
     f = set(m.get_accept_states())
-    size = None
-    while len(f) != size:
-        size = len(f)
-        for t in m.get_transitions():
-            [[q], [a]], [[r]] = t.lhs, t.rhs
-            if r in f:
+    agenda = collections.deque(f)
+    while len(agenda) > 0:
+        r = agenda.popleft()
+        for q in predecessors[r]:
+            if q not in f:
                 f.add(q)
+                agenda.append(q)
+
     mp = machines.FiniteAutomaton()
     mp.set_start_state(m.get_start_state())
     for t in m.get_transitions():
         mp.add_transition(t)
     mp.add_accept_states(f)
     return mp
-
@@ -0,0 +1,376 @@
+"""This module contains deterministic, table-driven parsers for CFGs.
+Building a table finds all the conflicts that would make the parser
+nondeterministic; if there are none, parsing takes linear time.
+
+Every table can also be converted to an equivalent PDA (which is how
+`from_grammar` with ``mode="ll1"``, ``mode="lr1"``, and
+``mode="lalr1"`` work)."""
+
+import collections
+from . import machines
+from . import syntax
+from . import trees
+from .grammars import END
+
+__all__ = ['LL1Table', 'LRTable']
+
+class LL1Table:
+    """The parse table of an LL(1) (predictive) parser for a CFG.
+
+    Arguments:
+        g (Grammar): a CFG
+    """
+
+    def __init__(self, g):
+        if not g.is_contextfree():
+            raise ValueError("grammar must be context-free")
+        self.g = g
+        nullable = g.compute_nullable()
+        first = g.compute_first(nullable)
+        follow = g.compute_follow(nullable, first)
+
+        self.rules = [(lhs, rhs.values) for [lhs], rhs in g.rules]
+        #: Dict mapping nonterminals to dicts mapping terminals (or
+        #: `END`) to lists of rules (as indices into `rules`).
+        self.table = {x: {} for x in g.nonterminals}
+        for r, ([lhs], rhs) in enumerate(g.rules):
+            looks = set(first[rhs])
+            if rhs in nullable:
+                looks.update(follow[lhs])
+            for c in looks:
+                self.table[lhs].setdefault(c, []).append(r)
+
+    def get_conflicts(self):
+        """Returns a list of triples (x, a, rules), where nonterminal x
+        has more than one rule for lookahead a."""
+        return [(x, a, rs)
+                for x, row in self.table.items()
+                for a, rs in row.items()
+                if len(rs) > 1]
+
+    def is_deterministic(self, verbose=False):
+        """Tests whether the table has no conflicts, that is, whether
+        the grammar is LL(1).
+
+        Arguments:
+            verbose (bool): print all the conflicts.
+        """
+        conflicts = self.get_conflicts()
+        if verbose:
+            for x, a, rs in conflicts:
+                print(f'nonterminal {x}, lookahead {a}:')
+                for r in rs:
+                    print(' ', _format_rule(self.rules[r]))
+        return len(conflicts) == 0
+
+    def parse(self, w):
+        """Parse string `w`, in linear time.
+
+        Returns:
+            Tree: the parse tree
+        Raises:
+            ValueError: if `w` has no parse, or if the table has
+              conflicts (for example, if the grammar is left-recursive,
+              choosing a rule could expand the same nonterminal forever
+              without reading any input)
+        """
+        if not self.is_deterministic():
+            raise ValueError("grammar is not LL(1)")
+        w = syntax.String(w)
+        root = trees.Tree(self.g.start_nonterminal)
+        stack = [root]
+        i = 0
+        while len(stack) > 0:
+            node = stack.pop()
+            a = w[i] if i < len(w) else END
+            if node.label in self.table:
+                rs = self.table[node.label].get(a)
+                if rs is None:
+                    raise ValueError(f'no parse (unexpected {a} at position {i})')
+                rhs = self.rules[rs[0]][1]
+                node.children = [trees.Tree(y) for y in rhs] or [trees.Tree('ε')]
+                if len(rhs) > 0:
+                    stack.extend(reversed(node.children))
+            elif node.label == a:
+                i += 1
+            else:
+                raise ValueError(f'no parse (unexpected {a} at position {i})')
+        if i < len(w):
+            raise ValueError(f'no parse (unexpected {w[i]} at position {i})')
+        return root
+
+    def to_pda(self):
+        """Convert to a PDA that simulates the parser, with the lookahead
+        held in the PDA's state. If the table has no conflicts, the PDA
+        is deterministic.
+
+        Returns:
+            Machine: a PDA
+        """
+        m = machines.PushdownAutomaton()
+        m.set_start_state('start')
+        m.add_transition(('start', [], []), ('loop', [self.g.start_nonterminal, '$']))
+        entries = sorted((r, c) for row in self.table.values() for c, rs in row.items() for r in rs)
+        for r, c in entries:
+            lhs, rhs = self.rules[r]
+            m.add_transition((c, [], lhs), (c, rhs))
+        for a in self.g.terminals:
+            m.add_transition(('loop', a, []), (a, []))
+            m.add_transition((a, [], a), ('loop', []))
+        m.add_transition(('loop', syntax.BLANK, []), (END, [])) # treat blank as endmarker
+        m.add_transition((END, [], '$'), ('accept', []))
+        m.add_accept_state("accept")
+        return m
+
+class LRTable:
+    """The ACTION and GOTO tables of an LR(1) or LALR(1) parser for a CFG.
+
+    The canonical LR(1) item sets are built directly, as in Aho et al.,
+    *Compilers* (2e), Section 4.7.2. For LALR(1), item sets with the
+    same items (ignoring lookaheads) are merged as soon as they are
+    found, and lookaheads are propagated until nothing changes.
+
+    Arguments:
+        g (Grammar): a CFG
+        method (str): ``"lr1"`` or ``"lalr1"``
+    """
+
+    def __init__(self, g, method="lr1"):
+        if not g.is_contextfree():
+            raise ValueError("grammar must be context-free")
+        if method not in ["lr1", "lalr1"]:
+            raise ValueError(f"unknown method '{method}'")
+        self.g = g
+        self.method = method
+        nonterminals = g.nonterminals
+
+        # Rules, plus a top pseudo-rule (with lhs None) at the end
+        self.rules = rules = [(lhs, rhs.values) for [lhs], rhs in g.rules]
+        top = len(rules)
+        rules.append((None, (g.start_nonterminal,)))
+        by_lhs = collections.defaultdict(list)
+        for r, (lhs, rhs) in enumerate(rules):
+            by_lhs[lhs].append(r)
+
+        # For each rule r and position d, FIRST(rhs[d+1:]) and
+        # whether rhs[d+1:] is nullable
+        nullable = g.compute_nullable()
+        first = g.compute_first(nullable)
+        after = []
+        for lhs, rhs in rules:
+            after.append([])
+            for d in range(len(rhs)):
+                rest = syntax.String(rhs[d+1:])
+                after[-1].append((frozenset(first[rest]), rest in nullable))
+
+        def closure(kernel):
+            items = {item: set(looks) for item, looks in kernel.items()}
+            agenda = list(items)
+            while len(agenda) > 0:
+                r, d = agenda.pop()
+                rhs = rules[r][1]
+                if d == len(rhs) or rhs[d] not in nonterminals:
+                    continue
+                looks, rest_nullable = after[r][d]
+                if rest_nullable:
+                    looks = looks | items[r, d]
+                for r1 in by_lhs[rhs[d]]:
+                    looks1 = items.get((r1, 0))
+                    if looks1 is None:
+                        items[r1, 0] = set(looks)
+                        agenda.append((r1, 0))
+                    elif not looks <= looks1:
+                        looks1 |= looks
+                        agenda.append((r1, 0))
+            return items
+
+        #: List of states, each a dict mapping kernel items (r, d) to
+        #: lookahead sets, meaning that the first d symbols of the rhs
+        #: of rule r have been seen.
+        self.states = states = []
+        #: List of dicts, one per state, mapping terminals (or `END`)
+        #: to lists of actions. Each action is ``('shift', q)``,
+        #: ``('reduce', r)``, or ``('accept',)``.
+        self.action = []
+        #: List of dicts, one per state, mapping nonterminals to states.
+        self.goto = []
+
+        index = {}
+        agenda = collections.deque()
+        queued = set()
+        def add_state(kernel):
+            if method == "lalr1":
+                key = frozenset(kernel)
+            else:
+                key = frozenset((item, frozenset(looks)) for item, looks in kernel.items())
+            q = index.get(key)
+            if q is None:
+                q = index[key] = len(states)
+                states.append(kernel)
+                self.action.append({})
+                self.goto.append({})
+                agenda.append(q)
+                queued.add(q)
+            else:
+                # Only possible for LALR(1): merge lookaheads and, if
+                # there are new ones, revisit the state
+                changed = False
+                for item, looks in kernel.items():
+                    if not looks <= states[q][item]:
+                        states[q][item] |= looks
+                        changed = True
+                if changed and q not in queued:
+                    agenda.append(q)
+                    queued.add(q)
+            return q
+
+        add_state({(top, 0): {END}})
+        while len(agenda) > 0:
+            q = agenda.popleft()
+            queued.remove(q)
+            action = collections.defaultdict(list)
+            goto = {}
+            kernels = {}
+            for (r, d), looks in closure(states[q]).items():
+                rhs = rules[r][1]
+                if d < len(rhs):
+                    kernel = kernels.setdefault(rhs[d], {})
+                    kernel.setdefault((r, d+1), set()).update(looks)
+                elif r == top:
+                    action[END].append(('accept',))
+                else:
+                    for a in looks:
+                        action[a].append(('reduce', r))
+            for x, kernel in kernels.items():
+                q1 = add_state(kernel)
+                if x in nonterminals:
+                    goto[x] = q1
+                else:
+                    action[x].append(('shift', q1))
+            # Put the default action first: accept, then shift, then
+            # the reduce by the earliest rule (as in yacc)
+            order = {'accept': 0, 'shift': 1, 'reduce': 2}
+            for acts in action.values():
+                acts.sort(key=lambda act: (order[act[0]], act[1:]))
+            self.action[q] = dict(action)
+            self.goto[q] = goto
+
+    def get_conflicts(self):
+        """Returns a list of triples (q, a, actions), where state q has
+        more than one action on terminal a."""
+        return [(q, a, acts)
+                for q, action in enumerate(self.action)
+                for a, acts in action.items()
+                if len(acts) > 1]
+
+    def is_deterministic(self, verbose=False):
+        """Tests whether the table has no conflicts, that is, whether
+        the grammar is LR(1) or LALR(1).
+
+        Arguments:
+            verbose (bool): print all the conflicts.
+        """
+        conflicts = self.get_conflicts()
+        if verbose:
+            for q, a, acts in conflicts:
+                print(f'state {q}, lookahead {a}:')
+                for act in acts:
+                    if act[0] == 'reduce':
+                        print('  reduce', _format_rule(self.rules[act[1]]))
+                    else:
+                        print(' ', ' '.join(map(str, act)))
+        return len(conflicts) == 0
+
+    def parse(self, w):
+        """Parse string `w`, in linear time. If the table has conflicts,
+        the first action in each entry is used, so shift is preferred
+        over reduce and earlier rules are preferred over later ones.
+
+        Returns:
+            Tree: the parse tree
+        Raises:
+            ValueError: if `w` has no parse
+        """
+        w = syntax.String(w)
+        rules = self.rules
+        states = [0]
+        stack = []
+        i = 0
+        while True:
+            a = w[i] if i < len(w) else END
+            acts = self.action[states[-1]].get(a)
+            if acts is None:
+                raise ValueError(f'no parse (unexpected {a} at position {i})')
+            act = acts[0]
+            if act[0] == 'shift':
+                states.append(act[1])
+                stack.append(trees.Tree(a))
+                i += 1
+            elif act[0] == 'reduce':
+                lhs, rhs = rules[act[1]]
+                n = len(rhs)
+                children = stack[len(stack)-n:] or [trees.Tree('ε')]
+                del stack[len(stack)-n:], states[len(states)-n:]
+                states.append(self.goto[states[-1]][lhs])
+                stack.append(trees.Tree(lhs, children))
+            else:
+                [tree] = stack
+                return tree
+
+    def to_pda(self):
+        """Convert to a PDA that simulates the parser. The stack holds the
+        parser states, and the lookahead is held in the PDA's state. If
+        the table has no conflicts, the PDA is deterministic.
+
+        Returns:
+            Machine: a PDA
+        """
+        # For each state, the states with a transition into it
+        preds = collections.defaultdict(set)
+        for q, action in enumerate(self.action):
+            for acts in action.values():
+                for act in acts:
+                    if act[0] == 'shift':
+                        preds[act[1]].add(q)
+        for q, goto in enumerate(self.goto):
+            for q1 in goto.values():
+                preds[q1].add(q)
+
+        def paths(q, n):
+            """Paths of n transitions ending in q, as lists of states
+            (top of stack first)."""
+            ps = [[q]]
+            for _ in range(n):
+                ps = [p + [q0] for p in ps for q0 in sorted(preds[p[-1]])]
+            return ps
+
+        m = machines.PushdownAutomaton()
+        m.set_start_state('start')
+        m.add_transition(('start', [], []), ('loop', ['0']))
+        terminals = set()
+        for q, action in enumerate(self.action):
+            for a, acts in action.items():
+                terminals.add(a)
+                for act in acts:
+                    if act[0] == 'shift':
+                        m.add_transition((a, [], [str(q)]), ('loop', [str(act[1]), str(q)]))
+                    elif act[0] == 'reduce':
+                        lhs, rhs = self.rules[act[1]]
+                        for p in paths(q, len(rhs)):
+                            q1 = self.goto[p[-1]].get(lhs)
+                            if q1 is None:
+                                continue
+                            m.add_transition((a, [], list(map(str, p))),
+                                             (a, [str(q1), str(p[-1])]))
+                    else:
+                        m.add_transition((a, [], [str(q), '0']), ('accept', []))
+        terminals.discard(END)
+        for a in sorted(terminals):
+            m.add_transition(('loop', a, []), (a, []))
+        m.add_transition(('loop', syntax.BLANK, []), (END, [])) # treat blank as endmarker
+        m.add_accept_state('accept')
+        return m
+
+def _format_rule(rule):
+    lhs, rhs = rule
+    return f"{lhs} → {' '.join(map(str, rhs)) or 'ε'}"
@@ -1,3 +1,6 @@
+import collections
+import dataclasses
+import weakref
 from . import machines
 from . import syntax
 from . import graphs
@@ -22,17 +25,61 @@ class RegularExpression:
     The empty string is represented as RegularExpression('concatenation', ()).
 
     The empty set is represented as RegularExpression('union', ()).
+
+    RegularExpressions are immutable and hash-consed: there is only one
+    RegularExpression for each distinct op and args, so equal
+    subexpressions are stored once, and equality is identity. The
+    functions `union`, `concatenation`, `star`, and `symbol` should
+    normally be used instead of the constructor, because they simplify
+    the result.
     """
-    def __init__(self, op, args, start=None, end=None):
-        self.op = op
-        self.args = tuple(args)
-        self.start = start
-        self.end = end
 
+    __slots__ = ('op', 'args', 'size', '_hash', '_order', '__weakref__')
+    _table = weakref.WeakValueDictionary() # All live RegularExpressions, indexed by (op, args)
+
+    def __new__(cls, op, args):
+        args = tuple(args)
+        if op == 'symbol':
+            [a] = args
+            if not isinstance(a, syntax.Symbol):
+                args = (syntax.Symbol(a),)
+            # Symbols and SymbolClasses with the same text are equal
+            key = (op, args, args[0].__class__)
+        else:
+            key = (op, args)
+        self = cls._table.get(key)
+        if self is None:
+            self = object.__new__(cls)
+            object.__setattr__(self, 'op', op)
+            object.__setattr__(self, 'args', args)
+            #: Number of nodes in the tree
+            object.__setattr__(self, 'size', 1 if op == 'symbol' else
+                               1 + sum(arg.size for arg in args))
+            object.__setattr__(self, '_hash', hash(key))
+            # Sort key for the arguments of a union: the leftmost
+            # symbol comes first so that unions print in a natural order.
+            if op == 'symbol':
+                order = (str(args[0]), 0, ())
+            else:
+                children = tuple(arg._order for arg in args)
+                lead = min(children)[0] if op == 'union' and children else (
+                    children[0][0] if children else '')
+                order = (lead, ['symbol', 'star', 'concatenation', 'union'].index(op), children)
+            object.__setattr__(self, '_order', order)
+            cls._table[key] = self
+        return self
+
+    def __setattr__(self, name, value):
+        raise dataclasses.FrozenInstanceError(f"cannot assign to field '{name}'")
+    def __delattr__(self, name):
+        raise dataclasses.FrozenInstanceError(f"cannot delete field '{name}'")
+    def __reduce__(self):
+        return (RegularExpression, (self.op, self.args))
+
+    def __hash__(self):
+        return self._hash
     def __eq__(self, other):
-        return (isinstance(other, RegularExpression) and
-                self.op == other.op and
-                all(schild == ochild for schild, ochild in zip(self.args, other.args)))
+        return self is other
 
     def __str__(self, format='ascii'):
         if self.op == 'union':
@@ -93,23 +140,34 @@ class RegularExpression:
     def _repr_html_(self):
         return self.__str__(format='html')
 
+EMPTYSET = RegularExpression('union', ())
+EPSILON = RegularExpression('concatenation', ())
+
 def union(args):
-    newargs = []
+    """Union of `args`. Nested unions are flattened, duplicates and ∅
+    are removed, alternatives are sorted, and ε is dropped if another
+    alternative is a star."""
+    newargs = set()
     for arg in args:
         if arg.op == 'union':
-            newargs.extend(arg.args)
+            newargs.update(arg.args)
         else:
-            newargs.append(arg)
+            newargs.add(arg)
+    if EPSILON in newargs and any(arg.op == 'star' for arg in newargs):
+        newargs.remove(EPSILON)
     if len(newargs) == 1:
-        return newargs[0]
+        [arg] = newargs
+        return arg
     else:
-        return RegularExpression('union', newargs)
+        return RegularExpression('union', sorted(newargs, key=lambda arg: arg._order))
 
 def concatenation(args):
+    """Concatenation of `args`. Nested concatenations are flattened, ε
+    is removed, and if any argument is ∅, the result is ∅."""
     newargs = []
     for arg in args:
-        if arg.op == 'union' and len(arg.args) == 0: # empty set
-            return union([])
+        if arg is EMPTYSET:
+            return EMPTYSET
         elif arg.op == 'concatenation':
             newargs.extend(arg.args)
         else:
@@ -120,8 +178,14 @@ def concatenation(args):
         return RegularExpression('concatenation', newargs)
 
 def star(arg):
-    if arg in ['union', 'concatenation'] and len(arg.args) == 0:
-        return concatenation([])
+    """Kleene star of `arg`, using ∅* = ε* = ε, (r*)* = r*, and
+    (ε ∪ r)* = r*."""
+    if arg is EMPTYSET or arg is EPSILON:
+        return EPSILON
+    elif arg.op == 'star':
+        return arg
+    elif arg.op == 'union' and EPSILON in arg.args:
+        return star(union(x for x in arg.args if x is not EPSILON))
     else:
         return RegularExpression('star', [arg])
 
@@ -180,14 +244,25 @@ def parse_base(s):
     else:
         assert False
 
-def from_regexp(e, display_steps=False):
+def from_regexp(e, display_steps=False, method='thompson'):
     """Convert a regular expression to a NFA.
 
     Arguments:
         e (RegularExpression or str): the regular expression to convert.
         display_steps (bool): if True and if run inside a Jupyter notebook,
-          displays all steps of the conversion.
+          displays all steps of the conversion (only for ``'thompson'``).
+        method (str): ``'thompson'`` for the construction of Sipser (3e),
+          Lemma 1.55, which builds a NFA for each subexpression and
+          joins them with ε-transitions; or ``'glushkov'`` for the
+          position automaton, which has one state per occurrence of a
+          symbol, plus a start state, and no ε-transitions (see
+          `glushkov`).
     """
+    if method == 'glushkov':
+        return glushkov(e)
+    elif method != 'thompson':
+        raise ValueError(f"unknown method '{method}'")
+
     def count(e):
         """Predetermine number of states we will need."""
         if e.op == 'union':
@@ -271,6 +346,97 @@ def from_regexp(e, display_steps=False):
     m, _ = visit(e, 1)
     return m
 
+def glushkov(e):
+    """Convert a regular expression to a NFA without ε-transitions,
+    using the Glushkov (position) construction.
+
+    Each occurrence of a symbol in `e` is a position, and each position
+    is a state, reached by reading that symbol. A position can follow
+    another if some string in the language has the two symbols next to
+    each other at those positions. One pass over the tree computes
+    whether each subexpression is nullable, its first and last
+    positions, and the follow sets (all sets are bitsets).
+
+    Arguments:
+        e (RegularExpression or str): the regular expression to convert.
+    """
+    if isinstance(e, str):
+        e = str_to_regexp(e)
+
+    symbols = [None] # position -> symbol; position 0 is the start state
+    follow = [0]     # position -> bitset of positions that can follow it
+
+    def members(bits):
+        while bits:
+            low = bits & -bits
+            yield low.bit_length()-1
+            bits ^= low
+
+    # Postorder traversal. Subexpressions are hash-consed, so they are
+    # visited once per occurrence. Each result is a triple
+    # (nullable, first, last).
+    results = []
+    agenda = [(e, False)]
+    while len(agenda) > 0:
+        node, done = agenda.pop()
+        if node.op == 'symbol':
+            [a] = node.args
+            bit = 1 << len(symbols)
+            symbols.append(a)
+            follow.append(0)
+            results.append((False, bit, bit))
+            continue
+        if not done:
+            agenda.append((node, True))
+            agenda.extend((arg, False) for arg in reversed(node.args))
+            continue
+        args = results[len(results)-len(node.args):]
+        del results[len(results)-len(node.args):]
+
+        if node.op == 'union':
+            nullable, first, last = False, 0, 0
+            for anullable, afirst, alast in args:
+                nullable = nullable or anullable
+                first |= afirst
+                last |= alast
+
+        elif node.op == 'concatenation':
+            nullable, first, last = True, 0, 0
+            for anullable, afirst, alast in args:
+                for p in members(last):
+                    follow[p] |= afirst
+                if nullable:
+                    first |= afirst
+                last = alast | (last if anullable else 0)
+                nullable = nullable and anullable
+
+        elif node.op == 'star':
+            [(_, first, last)] = args
+            for p in members(last):
+                follow[p] |= first
+            nullable = True
+
+        else:
+            assert False
+        results.append((nullable, first, last))
+
+    [(nullable, first, last)] = results
+    follow[0] = first
+
+    def state(p):
+        return "q" + str(p).zfill(len(str(len(symbols)-1)))
+
+    m = machines.FiniteAutomaton()
+    m.set_start_state(state(0))
+    for p in range(len(symbols)):
+        for r in members(follow[p]):
+            m.add_transition((state(p), symbols[r]), (state(r),))
+    if nullable:
+        last |= 1
+    for p in members(last):
+        m.add_accept_state(state(p))
+    return m
+
 def fresh(s, alphabet):
     while s in alphabet:
         s += "'"
@@ -279,16 +445,45 @@ def fresh(s, alphabet):
 def to_regexp(m, display_steps=False):
     """Convert a finite automaton to a regular expression.
 
+    States are eliminated one at a time (Sipser (3e), Lemma 1.60). The
+    order matters a lot for the size of the result, so each time, we
+    eliminate the state with the least weight, which estimates how
+    much the total size of the expressions would grow (Delgado and
+    Morais, 2004): if a state has incoming edges with sizes i1, i2, ...,
+    outgoing edges with sizes o1, o2, ..., and a loop with size l, its
+    weight is Σ ij (#out-1) + Σ oj (#in-1) + l (#in #out - 1).
+
     Arguments:
         m (Machine): the automaton to convert, which must be a finite automaton.
         display_steps (bool): if True and if run inside a Jupyter notebook,
           displays all steps of the conversion.
     """
+    # Edges are stored twice, in outgoing[q][r] and incoming[r][q]
+    outgoing = collections.defaultdict(dict)
+    incoming = collections.defaultdict(dict)
+
     def union_edge(q, r, e):
-        if g.has_edge(q, r):
-            g[q][r][0]['label'] = union([g[q][r][0]['label'], e])
-        else:
-            g.add_edge(q, r, {'label': e})
+        if r in outgoing[q]:
+            e = union([outgoing[q][r], e])
+        outgoing[q][r] = incoming[r][q] = e
+
+    def weight(s):
+        ins = [e.size for q, e in incoming[s].items() if q != s]
+        outs = [e.size for r, e in outgoing[s].items() if r != s]
+        loop = outgoing[s][s].size if s in outgoing[s] else 0
+        return (sum(ins) * (len(outs)-1) + sum(outs) * (len(ins)-1) +
+                loop * (len(ins)*len(outs)-1))
+
+    def to_graph():
+        g = graphs.Graph({'rankdir': 'LR'})
+        g.add_node(start, {'start': True})
+        g.add_node(accept, {'accept': True})
+        for q in states:
+            g.add_node(q)
+        for q in outgoing:
+            for r, e in outgoing[q].items():
+                g.add_edge(q, r, {'label': e})
+        return g
 
     if display_steps:
         from IPython.display import display, HTML
@@ -296,50 +491,51 @@ def to_regexp(m, display_steps=False):
     if not m.is_finite():
         raise TypeError("machine must be a finite automaton")
 
-    states = sorted(m.states)
-
-    g = graphs.Graph({'rankdir': 'LR'})
     for t in m.get_transitions():
         [[lstate], read] = t.lhs
         [[rstate]] = t.rhs
         union_edge(lstate, rstate, concatenation(symbol(x) for x in read))
 
+    states = m.states | {m.get_start_state()} | m.get_accept_states()
+
     # Add new start and accept nodes
-    start = fresh('start', m.states)
-    g.add_node(start, {'start': True})
-    g.add_edge(start, m.get_start_state(), {'label': concatenation([])})
-    accept = fresh('accept', m.states)
-    g.add_node(accept, {'accept': True})
+    start = fresh('start', states)
+    union_edge(start, m.get_start_state(), concatenation([]))
+    accept = fresh('accept', states)
     for q in m.get_accept_states():
-        g.add_edge(q, accept, {'label': concatenation([])})
+        union_edge(q, accept, concatenation([]))
+
+    # Break ties in favor of the last state in sorted order
+    order = {q: i for i, q in enumerate(sorted(states))}
 
     if display_steps:
-        display(g)
+        display(to_graph())
 
     while len(states) > 0:
-        s = states.pop()
+        s = min(states, key=lambda s: (weight(s), -order[s]))
+        states.remove(s)
         if display_steps:
             display(HTML("eliminate " + s))
-        for q in states + [start]:
-            for r in states + [accept]:
-                try:
-                    inexpr = union(e['label'] for e in g.edges[q][s])
-                    outexpr = union(e['label'] for e in g.edges[s][r])
-                except KeyError:
-                    continue
-                if g.has_edge(s,s):
-                    loopexpr = union(e['label'] for e in g.edges[s][s])
-                    expr = concatenation([inexpr, star(loopexpr), outexpr])
+
+        loop = outgoing[s].pop(s, None)
+        incoming[s].pop(s, None)
+        ins = incoming.pop(s, {})
+        outs = outgoing.pop(s, {})
+        for q in ins:
+            del outgoing[q][s]
+        for r in outs:
+            del incoming[r][s]
+        for q, inexpr in ins.items():
+            for r, outexpr in outs.items():
+                if loop is not None:
+                    union_edge(q, r, concatenation([inexpr, star(loop), outexpr]))
                 else:
-                    expr = concatenation([inexpr, outexpr])
-                union_edge(q, r, expr)
-        g.remove_node(s)
+                    union_edge(q, r, concatenation([inexpr, outexpr]))
 
         if display_steps:
-            display(g)
+            display(to_graph())
 
-    if g.has_edge(start, accept):
-        return g.edges[start][accept][0]['label']
+    if accept in outgoing[start]:
+        return outgoing[start][accept]
     else:
         return union([])
-
@@ -4,8 +4,9 @@ strings. Normally, `run` is the only function one needs to use."""
 import collections
 from . import machines
 from . import graphs
+from . import operations
 
-__all__ = ['run', 'run_bfs', 'run_pda']
+__all__ = ['run', 'run_bfs', 'run_lazy', 'run_pda']
 
 def run(m, w, trace=False, steps=1000, show_stack=3):
     """Runs machine `m` on string `w`, automatically selecting a search method.
@@ -26,6 +27,10 @@ def run(m, w, trace=False, steps=1000, show_stack=3):
         `w`.
     """
 
+    if isinstance(m, operations.LazyDFA):
+        if trace: print("using lazy determinization")
+        return run_lazy(m, w, trace=trace)
+
     # Check to see whether run_pda can handle it.
     is_pda = True
 
@@ -98,7 +103,7 @@ def run_bfs(m, w, trace=False, steps=1000):
             run.add_node(tconfig, {'incomplete': True})
             continue
 
-        for rule in m.transitions:
+        for rule in m.get_transitions_from(tconfig):
             if trace: print("rule: {}".format(rule))
             if rule.match(tconfig):
                 nconfig = rule.apply(tconfig)
@@ -127,6 +132,50 @@ def run_bfs(m, w, trace=False, steps=1000):
 
     return run
 
+def run_lazy(m, w, trace=False):
+    """Runs a `LazyDFA` `m` on string `w`, computing only the states and
+    transitions that the run visits.
+
+    Arguments:
+
+        m (LazyDFA):  The machine to run.
+        w (String):   The string to run on.
+        trace (bool): Print the steps of the simulation to stdout.
+
+    Returns:
+
+        Same as `run`.
+    """
+    from .machines import Store, Configuration, Transition
+
+    w = Store(w)
+    run = graphs.Graph()
+    run.attrs['rankdir'] = 'LR'
+
+    q = m.start_set
+    config = Configuration([[q], w])
+    run.add_node(config, {'start': True})
+    for i, a in enumerate(w):
+        r = m.step(q, a)
+        nconfig = Configuration([[r], w.values[i+1:]])
+        if trace: print("add: {}".format(nconfig))
+        run.add_edge(config, nconfig, {'transition': Transition([[q], [a]], [[r], []])})
+        q, config = r, nconfig
+    if m.is_accept_state(q):
+        run.add_node(config, {'accept': True})
+
+    for c in run.nodes:
+        run.nodes[c]['rank'] = c[1]
+        run.nodes[c]['label'] = Configuration([c[0]])
+    for i in range(len(w)+1):
+        r = 'rank{}'.format(i)
+        run.add_node(r, {'rank' : Store(w[i:]), 'style' : 'invisible'})
+        if i > 0:
+            run.add_edge(rprev, r, {'color': 'white', 'label' : w[i-1]})
+        rprev = r
+
+    return run
+
 def run_pda(m, w, stack=2, trace=False, show_stack=3, keep_nodes=False):
     """Runs a nondeterministic pushdown automaton using a cubic-time
     algorithm based on: Bernard Lang, "Deterministic techniques for
@@ -198,26 +247,18 @@ def run_pda(m, w, stack=2, trace=False, show_stack=3, keep_nodes=False):
 
     # how much of the stack is not elided
     show_stack = max(show_stack, 
-                     max(len(t.lhs[stack]) for t in m.transitions), 
+                     m._get_transition_index().max_lhs[stack],
                      max(len(c[stack]) for c in m.accept_configs))
 
     def pop(config):
-        stores = []
-        for si in range(len(config)):
-            if si == stack:
-                stores.append(Store(config[si][:-1], config[si].position))
-            else:
-                stores.append(config[si])
-        return Configuration(stores)
+        stores = list(config.stores)
+        stores[stack] = Store._make(stores[stack].values[:-1], stores[stack].position)
+        return Configuration._make(tuple(stores))
     
     def push(config, x):
-        stores = []
-        for si in range(len(config)):
-            if si == stack:
-                stores.append(Store(config[si].values+(x,), config[si].position))
-            else:
-                stores.append(config[si])
-        return Configuration(stores)
+        stores = list(config.stores)
+        stores[stack] = Store._make(stores[stack].values+(x,), stores[stack].position)
+        return Configuration._make(tuple(stores))
 
     # Axiom
     config = list(m.start_config)
@@ -301,7 +342,7 @@ def run_pda(m, w, stack=2, trace=False, show_stack=3, keep_nodes=False):
 
         # The stack is just right (Apply)
         else:
-            for transition in m.transitions:
+            for transition in m.get_transitions_from(child):
                 if transition.match(child):
                     sister = transition.apply(child)
                     add(parent, sister, parent, child, transition=transition)
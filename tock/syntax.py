@@ -1,5 +1,12 @@
 import re
+import bisect
+import collections
+import collections.abc
 import dataclasses
+import functools
+import itertools
+import operator
+import weakref
 from . import settings
 
 class Tokens:
@@ -23,8 +30,6 @@ class Tokens:
     def next(self):
         return self.tokens[self.pos+1]
 
-whitespace_re = re.compile(r"\s*(//.*)?")
-
 def repr_html(x):
     if hasattr(x, '_repr_html_'):
         return x._repr_html_()
@@ -35,13 +40,335 @@ def repr_html(x):
 symbol_re = re.compile(r"\|-|-\||[⊢⊣#$¢␣]|[A-Za-z0-9_.']+")
 symbol_mappings = {'|-': '⊢', '-|': '⊣', '_': '␣'}
 class Symbol(str):
+    """A symbol, which is a str. Symbols are interned: there is only one
+    Symbol for each distinct str, and it has a unique integer `id`.
+    Arguments that are not strs (like the sets and tuples used as
+    states) are converted to strs first."""
+
+    # All Symbols in use, indexed by str. Symbols that are no longer
+    # referenced anywhere else are dropped.
+    table = weakref.WeakValueDictionary()
+    _ids = itertools.count() # Shared with SymbolClass
+
     def __new__(cls, s):
+        s = str(s)
         s = symbol_mappings.get(s, s)
-        return str.__new__(cls, s)
+        x = Symbol.table.get(s)
+        if x is None:
+            x = str.__new__(cls, s)
+            x.id = next(Symbol._ids) #: Integer id, unique to this Symbol
+            Symbol.table[s] = x
+        return x
+    def __reduce__(self):
+        return (Symbol, (str(self),))
     def _repr_html_(self):
         return self
 BLANK = Symbol('_')
 
+# Symbol classes, like [a-z] or [^abc], stand for sets of
+# single-character symbols.
+symbolclass_re = re.compile(r"\[\^?(?:\\.|[^\]\\])*\]")
+MAX_CHAR = 0x10FFFF
+
+class SymbolClass(Symbol):
+    """A set of single-character symbols, written like a character class
+    in a regular expression:
+
+    - ``[abc]`` matches ``a``, ``b``, or ``c``
+    - ``[a-z0-9]`` matches a lowercase letter or a digit
+    - ``[^abc]`` matches any single-character symbol other than ``a``, ``b``, or ``c``
+    - ``[^]`` matches any single-character symbol
+
+    A SymbolClass never matches the blank symbol (``_`` or ``␣``).
+    Inside the brackets, a backslash escapes the next character, and
+    ``\\xhh``, ``\\uhhhh``, and ``\\Uhhhhhhhh`` are character codes.
+    A SymbolClass can be used in place of a `Symbol` in the left-hand
+    side of a transition, where it matches any of its members.
+
+    SymbolClasses are interned separately from Symbols, by their
+    normalized written form, and also have an `id`. A SymbolClass is
+    never equal to a Symbol, even one with the same written form.
+
+    Arguments:
+        s (str or iterable): the written form, or an iterable of (lo, hi)
+          pairs of character codes (inclusive).
+    """
+
+    table = weakref.WeakValueDictionary() # All SymbolClasses in use, indexed by written form
+
+    def __new__(cls, s):
+        if isinstance(s, str):
+            ranges = parse_ranges(s)
+        else:
+            ranges = normalize_ranges(s)
+        key = format_ranges(ranges)
+        self = SymbolClass.table.get(key)
+        if self is None:
+            self = str.__new__(cls, key)
+            self.ranges = ranges #: Sorted, disjoint tuple of (lo, hi) character codes
+            self.id = next(Symbol._ids)
+            SymbolClass.table[key] = self
+        return self
+    def __reduce__(self):
+        return (SymbolClass, (str(self),))
+
+    def __eq__(self, other):
+        return isinstance(other, SymbolClass) and str.__eq__(self, other)
+    def __ne__(self, other):
+        return not self == other
+    def __hash__(self):
+        return hash((SymbolClass, str(self)))
+
+    def __contains__(self, x):
+        if (not isinstance(x, str) or len(x) != 1 or
+            isinstance(x, SymbolClass) or x == BLANK):
+            return False
+        c = ord(x)
+        i = bisect.bisect_right(self.ranges, (c, MAX_CHAR)) - 1
+        return i >= 0 and self.ranges[i][0] <= c <= self.ranges[i][1]
+
+    def _members(self):
+        """The ranges of character codes, minus the blank."""
+        return intersect_ranges(self.ranges, NONBLANK_RANGES)
+
+    def size(self):
+        """The number of symbols in this class."""
+        return sum(hi-lo+1 for lo, hi in self._members())
+
+    def nth(self, i):
+        """The `i`'th symbol in this class, in order of character code."""
+        for lo, hi in self._members():
+            if i <= hi-lo:
+                return Symbol(chr(lo+i))
+            i -= hi-lo+1
+        raise IndexError("SymbolClass index out of range")
+
+    def symbols(self):
+        """Iterate over all the symbols in this class."""
+        for lo, hi in self._members():
+            for c in range(lo, hi+1):
+                yield Symbol(chr(c))
+
+def normalize_ranges(ranges):
+    result = []
+    for lo, hi in sorted(ranges):
+        if lo > hi:
+            continue
+        if len(result) > 0 and lo <= result[-1][1]+1:
+            result[-1] = (result[-1][0], max(result[-1][1], hi))
+        else:
+            result.append((lo, hi))
+    return tuple(result)
+
+def complement_ranges(ranges):
+    result = []
+    prev = 0
+    for lo, hi in ranges:
+        if prev < lo:
+            result.append((prev, lo-1))
+        prev = hi+1
+    if prev <= MAX_CHAR:
+        result.append((prev, MAX_CHAR))
+    return tuple(result)
+
+def intersect_ranges(ranges1, ranges2):
+    result = []
+    i = j = 0
+    while i < len(ranges1) and j < len(ranges2):
+        lo = max(ranges1[i][0], ranges2[j][0])
+        hi = min(ranges1[i][1], ranges2[j][1])
+        if lo <= hi:
+            result.append((lo, hi))
+        if ranges1[i][1] < ranges2[j][1]:
+            i += 1
+        else:
+            j += 1
+    return tuple(result)
+
+def parse_ranges(s):
+    """Parse the written form of a SymbolClass into ranges."""
+    if not (s.startswith('[') and s.endswith(']')):
+        raise ValueError(f"invalid symbol class {s}")
+    s = s[1:-1]
+    negated = s.startswith('^')
+    if negated:
+        s = s[1:]
+    chars = [] # pairs of (char code, whether it was escaped)
+    i = 0
+    while i < len(s):
+        if s[i] == '\\':
+            if i+1 == len(s):
+                raise ValueError("symbol class can't end with backslash")
+            n = {'x': 2, 'u': 4, 'U': 8}.get(s[i+1], 0)
+            if n > 0:
+                try:
+                    chars.append((int(s[i+2:i+2+n], 16), True))
+                except ValueError:
+                    raise ValueError(f"invalid character code {s[i:i+2+n]}")
+                i += 2+n
+            else:
+                chars.append((ord(s[i+1]), True))
+                i += 2
+        else:
+            chars.append((ord(s[i]), False))
+            i += 1
+    ranges = []
+    i = 0
+    while i < len(chars):
+        lo, _ = chars[i]
+        if i+2 < len(chars) and chars[i+1] == (ord('-'), False):
+            hi, _ = chars[i+2]
+            if hi < lo:
+                raise ValueError(f"invalid range {chr(lo)}-{chr(hi)}")
+            ranges.append((lo, hi))
+            i += 3
+        else:
+            ranges.append((lo, lo))
+            i += 1
+    ranges = normalize_ranges(ranges)
+    if negated:
+        ranges = complement_ranges(ranges)
+    return ranges
+
+NONBLANK_RANGES = ((0, ord(BLANK)-1), (ord(BLANK)+1, MAX_CHAR))
+
+def format_char(c):
+    x = chr(c)
+    if x in '\\[]^-':
+        return '\\' + x
+    elif x.isprintable() and not x.isspace():
+        return x
+    elif c <= 0xFF:
+        return f'\\x{c:02x}'
+    elif c <= 0xFFFF:
+        return f'\\u{c:04x}'
+    else:
+        return f'\\U{c:08x}'
+
+def format_ranges(ranges):
+    """Inverse of parse_ranges."""
+    negated = len(ranges) > 0 and ranges[0][0] == 0 and ranges[-1][1] == MAX_CHAR
+    if negated:
+        ranges = complement_ranges(ranges)
+    result = []
+    for lo, hi in ranges:
+        result.append(format_char(lo))
+        if hi == lo+1:
+            result.append(format_char(hi))
+        elif hi > lo+1:
+            result.append('-' + format_char(hi))
+    return '[' + ('^' if negated else '') + ''.join(result) + ']'
+
+def symbol_ranges(x):
+    """The ranges of character codes matched by Symbol or SymbolClass `x`.
+    A symbol with more than one character, or the blank, doesn't match
+    any."""
+    if isinstance(x, SymbolClass):
+        return x.ranges
+    elif len(x) == 1 and x != BLANK:
+        return ((ord(x), ord(x)),)
+    else:
+        return ()
+
+def symbol_matches(x, y):
+    """Tests whether the Symbol or SymbolClass `x` (as a pattern) matches
+    the Symbol `y`."""
+    return x == y or (isinstance(x, SymbolClass) and y in x)
+
+def symbols_match(xs, ys):
+    """Tests whether the sequence of patterns `xs` matches the sequence of
+    Symbols `ys` (see `symbol_matches`)."""
+    if xs == ys:
+        return True
+    if len(xs) != len(ys):
+        return False
+    for x, y in zip(xs, ys):
+        if not symbol_matches(x, y):
+            return False
+    return True
+
+def intersect_symbols(x, y):
+    """Returns a Symbol or SymbolClass that matches exactly the symbols
+    matched by both `x` and `y`, or None if there aren't any."""
+    if x == y:
+        return x
+    elif isinstance(x, SymbolClass) and isinstance(y, SymbolClass):
+        ranges = intersect_ranges(x.ranges, y.ranges)
+        if len(intersect_ranges(ranges, NONBLANK_RANGES)) == 0:
+            return None
+        return SymbolClass(ranges)
+    elif isinstance(x, SymbolClass):
+        return y if y in x else None
+    elif isinstance(y, SymbolClass):
+        return x if x in y else None
+    else:
+        return None
+
+def union_symbols(xs):
+    """Returns a list of Symbols and SymbolClasses that together match
+    exactly the symbols matched by any of `xs`. All single-character
+    symbols are merged into one Symbol or SymbolClass."""
+    result = []
+    ranges = []
+    for x in xs:
+        if isinstance(x, SymbolClass) or len(symbol_ranges(x)) > 0:
+            ranges.extend(symbol_ranges(x))
+        else:
+            result.append(x)
+    ranges = normalize_ranges(ranges)
+    if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+        result.append(Symbol(chr(ranges[0][0])))
+    elif len(ranges) > 0:
+        result.append(SymbolClass(ranges))
+    return result
+
+def split_symbols(labels):
+    """Compute the minterms of a collection of labels (Symbols or
+    SymbolClasses), that is, split the symbols they match into
+    disjoint parts such that each label either matches all of a part
+    or none of it.
+
+    Arguments:
+        labels: a dict mapping Symbols or SymbolClasses to values (which
+          must be combinable with ``|``, like sets or bitsets).
+    Returns:
+        A dict mapping each part (a Symbol or SymbolClass) to the ``|``
+        of the values of the labels that match it.
+    """
+    result = {}
+    events = collections.defaultdict(list)
+    for x, value in labels.items():
+        ranges = symbol_ranges(x)
+        if len(ranges) == 0:
+            result[x] = result[x] | value if x in result else value
+        for lo, hi in ranges:
+            events[lo].append((1, x))
+            events[hi+1].append((-1, x))
+
+    # Sweep over character codes, grouping the elementary intervals
+    # by which labels match them
+    parts = collections.defaultdict(list)
+    active = collections.Counter()
+    positions = sorted(events)
+    for i, pos in enumerate(positions):
+        for d, x in events[pos]:
+            active[x] += d
+            if active[x] == 0:
+                del active[x]
+        if len(active) > 0:
+            parts[frozenset(active)].append((pos, positions[i+1]-1))
+
+    for xs, ranges in parts.items():
+        value = None
+        for x in xs:
+            value = labels[x] if value is None else value | labels[x]
+        if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+            part = Symbol(chr(ranges[0][0]))
+        else:
+            part = SymbolClass(ranges)
+        result[part] = result[part] | value if part in result else value
+    return result
+
 # Operators
 operator_re = re.compile(r"->|[→&ε^(){},@>|∅∪*]")
 operator_mappings = {
@@ -57,28 +384,45 @@ ARROW = Operator('->')
 EPSILON = Operator('&')
 EMPTYSET = Operator('∅')
 
-def lexer(s):
-    i = 0
+# All tokens, combined into one regular expression. The symbol group
+# comes before the operator group so that |- isn't lexed as |.
+token_re = re.compile('|'.join([
+    r"(?P<space>\s+|//.*)",
+    f"(?P<symbol>{symbol_re.pattern})",
+    f"(?P<symbolclass>{symbolclass_re.pattern})",
+    f"(?P<operator>{operator_re.pattern})",
+    r"(?P<error>.)",
+]))
+
+CACHE_SIZE = 65536
+
+token_types = {'symbol': Symbol, 'symbolclass': SymbolClass, 'operator': Operator}
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def make_token(kind, text):
+    """Create a token of type `kind` from str `text`, reusing recently
+    created tokens."""
+    return token_types[kind](text)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def lex(s):
+    """Convert str `s` to a tuple of tokens (Symbols, SymbolClasses, and
+    Operators)."""
     tokens = []
-    m = whitespace_re.match(s, i)
-    if m:
-        i = m.end()
-    while i < len(s):
-        m = symbol_re.match(s, i)
-        if m:
-            token = Symbol(m.group())
-        else:
-            m = operator_re.match(s, i)
-            if m:
-                token = Operator(m.group())
-            else:
-                raise ValueError(f"couldn't understand input: {s[i:]}")
-        tokens.append(token)
-        i = m.end()
-        m = whitespace_re.match(s, i)
-        if m:
-            i = m.end()
-    return Tokens(tokens)
+    for m in token_re.finditer(s):
+        kind = m.lastgroup
+        if kind == 'space':
+            continue
+        text = m.group()
+        if kind == 'error':
+            if text == '[':
+                raise ValueError(f"couldn't understand symbol class: {s[m.start():]}")
+            raise ValueError(f"couldn't understand input: {s[m.start():]}")
+        tokens.append(make_token(kind, text))
+    return tuple(tokens)
+
+def lexer(s):
+    return Tokens(lex(s))
 
 def parse_character(s, c):
     if s.pos == len(s):
@@ -152,6 +496,22 @@ def parse_set(s):
     parse_character(s, '}')
     return value
 
+def cache(copy=None):
+    """Decorator that memoizes a function of a str. If the function
+    returns a mutable value, `copy` is applied to the cached value each
+    time it is returned."""
+    def decorator(f):
+        cached = functools.lru_cache(maxsize=CACHE_SIZE)(f)
+        if copy is None:
+            return cached
+        @functools.wraps(f)
+        def wrapper(s):
+            return copy(cached(s))
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+    return decorator
+
+@cache(copy=lambda x: (x[0], dict(x[1])))
 def str_to_state(s):
     """s is a string possibly preceded by > or @."""
     s = lexer(s)
@@ -169,18 +529,21 @@ def str_to_state(s):
     parse_end(s)
     return x, attrs
 
+@cache(copy=list)
 def str_to_string(s):
     s = lexer(s)
     x = parse_string(s)
     parse_end(s)
     return x
 
+@cache()
 def str_to_store(s):
     s = lexer(s)
     x = parse_store(s)
     parse_end(s)
     return x
 
+@cache()
 def str_to_config(s):
     """s is a comma-separated list of stores."""
     from .machines import Configuration
@@ -189,6 +552,7 @@ def str_to_config(s):
     parse_end(s)
     return Configuration(x)
 
+@cache(copy=set)
 def str_to_configs(s):
     """Convert str `s` in one of the following formats to a set of tuples of Stores:
        - {(w,x),(y,z)} -> {(w,x),(y,z)}
@@ -231,6 +595,7 @@ def configs_to_str(configs):
             strings.append('(' + ','.join(map(str, config)) + ')')
     return '{' + ','.join(strings) + '}'
 
+@cache()
 def str_to_transition(s):
     """s is a string of the form a,b or a,b->c,d"""
     from .machines import Transition
@@ -246,26 +611,95 @@ def str_to_transition(s):
 
 ### Data structures that print more like in math books
 
-@dataclasses.dataclass(frozen=True, order=True)
-class String:
+class Immutable:
+    """Base class for small immutable objects, which are created very
+    often. Subclasses declare their fields in both `__slots__` and
+    `_fields`. Equality, ordering, and hashing are based on the tuple of
+    fields (like a frozen dataclass), and the hash is computed at most
+    once."""
+
+    __slots__ = ('_hash',)
+    _fields = ()
+
+    @classmethod
+    def _make(cls, *values):
+        """Create an object directly from its field values, without
+        any checking or conversion."""
+        self = object.__new__(cls)
+        for field, value in zip(cls._fields, values):
+            object.__setattr__(self, field, value)
+        return self
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Called as self._key(self); returns the value of the field if
+        # there is only one, or a tuple of the values of the fields.
+        cls._key = operator.attrgetter(*cls._fields)
+
+    def __setattr__(self, name, value):
+        raise dataclasses.FrozenInstanceError(f"cannot assign to field '{name}'")
+    def __delattr__(self, name):
+        raise dataclasses.FrozenInstanceError(f"cannot delete field '{name}'")
+    def __reduce__(self):
+        return (self.__class__._make, tuple(getattr(self, field) for field in self._fields))
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            h = hash(self._key(self))
+            object.__setattr__(self, '_hash', h)
+            return h
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self is other or (hash(self) == hash(other) and self._key(self) == other._key(other))
+    def __ne__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return not self == other
+    def __lt__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._key(self) < other._key(other)
+    def __le__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._key(self) <= other._key(other)
+    def __gt__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._key(self) > other._key(other)
+    def __ge__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._key(self) >= other._key(other)
+
+    def __repr__(self):
+        fields = ', '.join(f'{field}={getattr(self, field)!r}' for field in self._fields)
+        return f'{self.__class__.__name__}({fields})'
+
+class String(Immutable):
     """A sequence of `Symbols` (not to be confused with `str`)."""
 
-    values: tuple #: A sequence of Symbols
-    
+    __slots__ = ('values',) #: A sequence of Symbols
+    _fields = ('values',)
+
     def __init__(self, values=None):
         if values is None:
             values = ()
         elif isinstance(values, str):
             values = tuple(str_to_string(values))
         else:
-            values = tuple(Symbol(x) for x in values)
+            values = tuple(x if isinstance(x, Symbol) else Symbol(x) for x in values)
         object.__setattr__(self, 'values', values)
 
     def __len__(self):
         return len(self.values)
     def __getitem__(self, i):
         if isinstance(i, slice):
-            return String(self.values[i])
+            return String._make(self.values[i])
         else:
             return self.values[i]
 
@@ -281,11 +715,68 @@ class String:
             return ' '.join(map(repr_html, self.values))
 
     def __add__(self, other):
-        return String(self.values + other.values)
+        return String._make(self.values + other.values)
     def __mul__(self, n):
-        return String(self.values * n)
+        return String._make(self.values * n)
     def __rmul__(self, n):
-        return String(n * self.values )
+        return String._make(n * self.values)
+
+class Alphabet(collections.abc.Set):
+    """A set of Symbols, each of which is assigned a dense integer id
+    (0, 1, 2, ...) in the order that it was added. Useful for
+    converting strings to and from lists of integers.
+
+    Arguments:
+        symbols: an iterable of Symbols (or strs) to add
+    """
+
+    def __init__(self, symbols=()):
+        self.symbols = [] #: List of Symbols, indexed by id
+        self.ids = {}     #: Dict mapping Symbols to ids
+        self.update(symbols)
+
+    def add(self, x):
+        """Add `x` if not already present, and return its id."""
+        i = self.ids.get(x)
+        if i is None:
+            x = x if isinstance(x, Symbol) else Symbol(x)
+            i = self.ids[x] = len(self.symbols)
+            self.symbols.append(x)
+        return i
+
+    def update(self, xs):
+        """Add all the Symbols in `xs`."""
+        for x in xs:
+            self.add(x)
+
+    def index(self, x):
+        """Return the id of `x`."""
+        try:
+            return self.ids[x]
+        except KeyError:
+            raise ValueError(f"{x} is not in alphabet") from None
+
+    def encode(self, w):
+        """Convert a String (or other sequence of Symbols) to a list of ids."""
+        return [self.index(x) for x in w]
+
+    def decode(self, ids):
+        """Convert a list of ids to a String."""
+        return String([self.symbols[i] for i in ids])
+
+    def __getitem__(self, i):
+        return self.symbols[i]
+    def __contains__(self, x):
+        return x in self.ids
+    def __iter__(self):
+        return iter(self.symbols)
+    def __len__(self):
+        return len(self.symbols)
+
+    def __str__(self):
+        return '{' + ','.join(map(str, sorted(self.symbols))) + '}'
+    def __repr__(self):
+        return f'Alphabet({self.symbols!r})'
 
 class Tuple(tuple):
     def __str__(self):